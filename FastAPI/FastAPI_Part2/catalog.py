@@ -0,0 +1,143 @@
+import re
+import threading
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Queries at least this long are answered from the n-gram index, shorter ones by word prefix
+NGRAM_SIZE = 3
+
+
+def ngrams(text: str, size: int = NGRAM_SIZE) -> Set[str]:
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+# Prefixes shorter than NGRAM_SIZE of every word in `text`
+def word_prefixes(text: str) -> Set[str]:
+    return {
+        word[:length]
+        for word in WORD_PATTERN.findall(text)
+        for length in range(1, min(len(word), NGRAM_SIZE - 1) + 1)
+    }
+
+
+class ItemCatalog:
+    """In-memory item catalog with a sorted primary index and a name search index.
+
+    Items live in a dict keyed by id, and a sorted list of ids is the primary
+    index: a page is a slice of that list, found with one bisect for keyset
+    (`after`) pagination or by position for skip/limit, so paging deep into
+    the catalog never walks the items before the page.
+
+    Searching matches item names case-insensitively. Queries of three or more
+    characters match anywhere in the name, using an index from each
+    3-character n-gram to the ids containing it; shorter queries match the
+    start of a word, using an index from each 1 and 2 character word prefix.
+
+    Route handlers may run in a thread pool, so changes go through one lock.
+    """
+
+    def __init__(self, items: Iterable[Any] = ()):
+        self._items: Dict[int, Any] = {}
+        self._ids: List[int] = []
+        self._by_ngram: Dict[str, Set[int]] = {}
+        self._by_prefix: Dict[str, Set[int]] = {}
+        self._next_id = 1
+        self._lock = threading.RLock()
+        for item in items:
+            self.add(item)
+
+    # Add an item, giving it the next free id when it has none; replaces an item with the same id
+    def add(self, item: Any) -> Any:
+        with self._lock:
+            if item.id is None:
+                item.id = self._next_id
+            if item.id in self._items:
+                self._remove(item.id)
+            self._items[item.id] = item
+            # Ids are usually handed out in increasing order, so appending is the common case
+            if not self._ids or self._ids[-1] < item.id:
+                self._ids.append(item.id)
+            else:
+                insort(self._ids, item.id)
+            self._next_id = max(self._next_id, item.id + 1)
+            self._index(item)
+            return item
+
+    def get(self, item_id: int) -> Optional[Any]:
+        return self._items.get(item_id)
+
+    def delete(self, item_id: int) -> Optional[Any]:
+        with self._lock:
+            if item_id not in self._items:
+                return None
+            return self._remove(item_id)
+
+    # A page of items ordered by id: skip `skip` items after the `after` id, then take `limit`
+    def page(
+        self,
+        skip: int = 0,
+        limit: int = 10,
+        search: Optional[str] = None,
+        after: Optional[int] = None,
+    ) -> List[Any]:
+        with self._lock:
+            start = bisect_right(self._ids, after) if after is not None else 0
+            if not search:
+                # Slicing a list only copies the slice, so the cost does not depend on how deep the page is
+                ids = self._ids[start + skip:start + skip + limit]
+            else:
+                matches = self._search(search.lower())
+                if len(matches) < len(self._ids) - start:
+                    # Fewer matches than ids left: sort the matches instead of walking the index
+                    ids = sorted(item_id for item_id in matches if after is None or item_id > after)
+                    ids = ids[skip:skip + limit]
+                else:
+                    ids = self._ids
+                    walk = (ids[index] for index in range(start, len(ids)) if ids[index] in matches)
+                    ids = list(islice(walk, skip, skip + limit))
+            return [self._items[item_id] for item_id in ids]
+
+    # Ids of the items whose name matches `query` (already lower-cased)
+    def _search(self, query: str) -> Set[int]:
+        if len(query) < NGRAM_SIZE:
+            return self._by_prefix.get(query, set())
+        id_sets = [self._by_ngram.get(gram, set()) for gram in ngrams(query)]
+        # Intersect starting from the smallest set so the work is bounded by it
+        id_sets.sort(key=len)
+        candidates = id_sets[0].intersection(*id_sets[1:])
+        # Shared n-grams do not guarantee a match ("abcd" and "bcda" share "bcd"), so check each name
+        return {item_id for item_id in candidates if query in self._items[item_id].name.lower()}
+
+    def _index(self, item: Any):
+        name = item.name.lower()
+        for gram in ngrams(name):
+            self._by_ngram.setdefault(gram, set()).add(item.id)
+        for prefix in word_prefixes(name):
+            self._by_prefix.setdefault(prefix, set()).add(item.id)
+
+    def _remove(self, item_id: int) -> Any:
+        item = self._items.pop(item_id)
+        del self._ids[bisect_left(self._ids, item_id)]
+        name = item.name.lower()
+        for gram in ngrams(name):
+            ids = self._by_ngram.get(gram)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del self._by_ngram[gram]
+        for prefix in word_prefixes(name):
+            ids = self._by_prefix.get(prefix)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del self._by_prefix[prefix]
+        return item
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
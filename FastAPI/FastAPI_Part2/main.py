@@ -1,9 +1,32 @@
+import sys
+from pathlib import Path
 from typing import Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Query, status
+from pydantic import BaseModel
+
+from catalog import ItemCatalog
+
+# Shared performance helpers live in fastapi_perf/ at the repository root
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from fastapi_perf.cache import install_response_cache  # noqa: E402
 
 app = FastAPI()
 
+# Reuses encoded responses of the read endpoints below until they expire or an item is written
+response_cache = install_response_cache(app)
+
+
+class Item(BaseModel):
+    id: Optional[int] = None  # Assigned by the catalog when left out
+    name: str
+    description: Optional[str] = None
+    price: float
+
+
+# In-memory item catalog, indexed by id for paging and by name for searching
+db = ItemCatalog()
+
 # Basic routing with an HTTP GET method to return a welcome message
 @app.get("/")
 async def home():
@@ -15,23 +38,39 @@ async def create_item(item: Item):
     Create an item in the database.
     """
     db.add(item)
+    response_cache.invalidate("items")
     return item
 
 # Defining a route that captures a path parameter
 @app.get("/users/{user_id}")
+@response_cache.cached(ttl=300)
 async def get_user(user_id: int):
     # FastAPI automatically validates and converts `user_id` to an integer
     return {"user_id": user_id}
 
 @app.get("/items/{category_id}/products/{product_id}")
+@response_cache.cached(ttl=300, tags=("items",))
 async def get_product(category_id: int, product_id: int):
     return {"category_id": category_id, "product_id": product_id}
 
+# Fetch a page of items ordered by id, optionally only those whose name matches `search_query`.
+# `after` starts the page after that item id (keyset pagination), `skip` then skips items from there.
+def fetch_items(skip: int, limit: int, search_query: Optional[str] = None, after: Optional[int] = None):
+    return db.page(skip=skip, limit=limit, search=search_query, after=after)
+
 # Defining a route that uses query parameters to filter data (e.g., for pagination)
 @app.get("/items/")
-async def read_items(skip: int = 0, limit: int = 10, search: Optional[str] = None):
-    items = fetch_items(skip=skip, limit=limit, search_query=search)
-    return {"items": items, "skip": skip, "limit": limit}
+@response_cache.cached(ttl=30, tags=("items",))
+async def read_items(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    search: Optional[str] = None,
+    after: Optional[int] = None,
+):
+    items = fetch_items(skip=skip, limit=limit, search_query=search, after=after)
+    # Pass next_after back as `after` to get the following page without counting from the start
+    next_after = items[-1].id if len(items) == limit else None
+    return {"items": items, "skip": skip, "limit": limit, "next_after": next_after}
 
 # Running the API with Uvicorn. This command should be in a separate runner file or in the command line.
 # `uvicorn main:app --reload` where `main` is the name of your Python file.
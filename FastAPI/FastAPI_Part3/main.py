@@ -1,15 +1,42 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field, EmailStr, validator, constr
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, validator, constr
 from typing import Optional, List
 from datetime import datetime
+from pathlib import Path
+import json
+import sys
 
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import HTMLResponse
 
+from sharded_store import ShardedDict
+from validation import CachedEmailStr, FieldCostStats, normalize_email_domain, timed_model, validate_batch
+
+# Shared performance helpers live in fastapi_perf/ at the repository root
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from fastapi_perf.cache import install_response_cache  # noqa: E402
+from fastapi_perf.limits import install_admission_control  # noqa: E402
+from fastapi_perf.metrics import install_metrics_from_env  # noqa: E402
+from fastapi_perf.static import StaticDocument  # noqa: E402
+
 app = FastAPI()
 
-# Simulated database for demonstration
-database_usernames = set()  # This set will store usernames to simulate a user database.
-database_items = {}  # This dictionary will simulate an item database by item_id.
+# Reuses encoded item responses until they expire or the item is written. Installed first so it
+# runs inside metrics and admission control: cache hits are still measured and rate-limited.
+response_cache = install_response_cache(app)
+
+# Per-route timing histograms on /metrics when ENABLE_METRICS=1
+install_metrics_from_env(app)
+
+# Sheds load with 503 past 256 in-flight requests; sign-ups are rate-limited per client with 429
+admission = install_admission_control(app)
+admission.limit("POST", "/users/", rate=20, burst=40)
+admission.limit("POST", "/users/batch", rate=2, burst=5, max_concurrent=4, max_queue=8)
+
+# Simulated database for demonstration, striped across lock-protected shards so it is safe under concurrent requests
+database_users = ShardedDict()  # Maps username -> user to simulate a user database.
+database_items = ShardedDict()  # Simulates an item database by item_id.
 
 
 class Address(BaseModel):
@@ -26,7 +53,7 @@ class User(BaseModel):
     username: str
     name: str = Field(..., example="John Doe", min_length=2, max_length=50)
     age: int = Field(ge=18, le=100, description="Age must be between 18 and 100.")
-    email: EmailStr = Field(description="Email address of the user.")
+    email: CachedEmailStr = Field(description="Email address of the user.")
     bio: Optional[str] = Field(None, max_length=300, description="A brief biography of the user.")
     address: Address  # Nested model
 
@@ -50,60 +77,150 @@ class Item(BaseModel):
     price: float
 
 
+class BatchUserError(BaseModel):
+    index: int
+    errors: List[dict]
+
+
+class BatchUserResult(BaseModel):
+    created: List[str]
+    errors: List[BatchUserError]
+
+
+MAX_BATCH_SIZE = 1000
+
+# Validators for batch imports, compiled once at startup instead of per request.
+# The batch size is checked before validation, so an oversized batch costs no validation work.
+users_adapter = TypeAdapter(List[User])
+validation_costs = FieldCostStats()
+timed_users_adapter = TypeAdapter(List[timed_model(User, validation_costs)])
+
+
 @app.post("/users/", response_model=User)
 async def create_user(user: User):
-    if user.username in database_usernames:
+    # Check and add in one atomic step so two concurrent requests cannot register the same username
+    if not database_users.insert_if_absent(user.username, user):
         raise HTTPException(status_code=400, detail="Username already registered")
-    database_usernames.add(user.username)  # Add username to the simulated database
     return user
 
 
+# Helper function to parse a batch body and reject batches that are too large before validating them
+def load_batch(payload: bytes):
+    try:
+        items = json.loads(payload)
+    except ValueError as exc:
+        raise RequestValidationError([{
+            "type": "json_invalid",
+            "loc": ("body", getattr(exc, "pos", 0)),
+            "msg": "JSON decode error",
+        }])
+    if isinstance(items, list) and len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413, detail=f"Batch is limited to {MAX_BATCH_SIZE} users"
+        )
+    return items
+
+
+# Helper function to parse and validate a batch body, CPU work that runs in the thread pool
+def load_and_validate_batch(adapter: TypeAdapter, payload: bytes):
+    items = load_batch(payload)
+    try:
+        return validate_batch(adapter, items)
+    except ValidationError as exc:
+        # Without the inputs: they would echo the submitted payload back once per error
+        errors = exc.errors(include_url=False, include_context=False, include_input=False)
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in errors])
+
+
+# Import many users at once: the JSON body is validated in one pass, valid users are
+# created and invalid ones are reported by index. profile=true records per-field validation cost.
+@app.post("/users/batch", response_model=BatchUserResult)
+async def create_users(request: Request, profile: bool = False):
+    adapter = timed_users_adapter if profile else users_adapter
+    # Parsing and validating up to MAX_BATCH_SIZE users is CPU work, keep it off the event loop
+    users, errors = await run_in_threadpool(load_and_validate_batch, adapter, await request.body())
+    created = []
+    for index, user in users:
+        if database_users.insert_if_absent(user.username, user):
+            created.append(user.username)
+        else:
+            errors.append({"index": index, "errors": [{
+                "type": "value_error",
+                "loc": ["body", index, "username"],
+                "msg": "Username already registered",
+            }]})
+    errors.sort(key=lambda error: error["index"])
+    return {"created": created, "errors": errors}
+
+
+# Time spent validating each user field in profiled batch imports, and email domain cache usage
+@app.get("/users/validation-stats")
+async def validation_stats():
+    cache = normalize_email_domain.cache_info()
+    return {
+        "fields": validation_costs.report(),
+        "email_domain_cache": {"hits": cache.hits, "misses": cache.misses, "size": cache.currsize},
+    }
+
+
 @app.get("/items/{item_id}", response_model=Item)
+@response_cache.cached(ttl=60, tags=("item:{item_id}",))
 async def read_item(item_id: int):
-    if item_id not in database_items:
+    item = database_items.get(item_id)
+    if item is None:
         raise HTTPException(status_code=404, detail="Item not found")
-    return database_items[item_id]
+    return item
+
+
+# The welcome page never changes, so it is rendered and compressed once at startup
+WELCOME_HTML = """
+<html>
+    <head>
+        <title>API Usage</title>
+        <style>
+            body { font-family: Arial, sans-serif; line-height: 1.6; padding: 20px; }
+            h1 { color: #333; }
+            ul { list-style-type: none; padding: 0; }
+            li { margin: 10px 0; }
+            code { background: #f4f4f4; padding: 2px 6px; }
+        </style>
+    </head>
+    <body>
+        <h1>Welcome to Our API!</h1>
+        <p>Here are some instructions on how to use this API:</p>
+        <ul>
+            <li>
+                <strong>POST</strong> - Create a new user. Requires a unique username.<br>
+                Endpoint: <code>/users/</code>
+            </li>
+            <li>
+                <strong>GET</strong> - Retrieve item details by item ID.<br>
+                Endpoint: <code>/items/{item_id}</code>
+            </li>
+        </ul>
+        <h2>Example Endpoints:</h2>
+        <ul>
+            <li>Create User: <code>/users/</code></li>
+            <li>Read Item: <code>/items/1</code></li>
+        </ul>
+    </body>
+</html>
+"""
+WELCOME_PAGE = StaticDocument(WELCOME_HTML, media_type="text/html; charset=utf-8")
 
 
 @app.get("/", response_class=HTMLResponse)
-async def welcome():
-    html_content = """
-    <html>
-        <head>
-            <title>API Usage</title>
-            <style>
-                body { font-family: Arial, sans-serif; line-height: 1.6; padding: 20px; }
-                h1 { color: #333; }
-                ul { list-style-type: none; padding: 0; }
-                li { margin: 10px 0; }
-                code { background: #f4f4f4; padding: 2px 6px; }
-            </style>
-        </head>
-        <body>
-            <h1>Welcome to Our API!</h1>
-            <p>Here are some instructions on how to use this API:</p>
-            <ul>
-                <li>
-                    <strong>POST</strong> - Create a new user. Requires a unique username.<br>
-                    Endpoint: <code>/users/</code>
-                </li>
-                <li>
-                    <strong>GET</strong> - Retrieve item details by item ID.<br>
-                    Endpoint: <code>/items/{item_id}</code>
-                </li>
-            </ul>
-            <h2>Example Endpoints:</h2>
-            <ul>
-                <li>Create User: <code>/users/</code></li>
-                <li>Read Item: <code>/items/1</code></li>
-            </ul>
-        </body>
-    </html>
-    """
-    return HTMLResponse(content=html_content)
-
-
-database_items[1] = Item(id=1, name="Widget", description="A useful widget", price=15.99)
-database_items[2] = Item(id=2, name="Gadget", description="An essential gadget", price=23.50)
+async def welcome(request: Request):
+    return WELCOME_PAGE.response(request)
+
+
+# Store an item and drop any cached response for it
+def save_item(item: Item):
+    database_items[item.id] = item
+    response_cache.invalidate(f"item:{item.id}")
+
+
+save_item(Item(id=1, name="Widget", description="A useful widget", price=15.99))
+save_item(Item(id=2, name="Gadget", description="An essential gadget", price=23.50))
 # Running the API with Uvicorn. This command should be in a separate runner file or in the command line.
 # `uvicorn main:app --reload` where `main` is the name of your Python file.
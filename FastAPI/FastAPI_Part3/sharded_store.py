@@ -0,0 +1,82 @@
+import threading
+from typing import Any, Dict, Generic, Hashable, Iterator, List, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+DEFAULT_SHARDS = 16
+
+
+class _Shard:
+    __slots__ = ("lock", "data")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data: Dict[Any, Any] = {}
+
+
+class ShardedDict(Generic[K, V]):
+    """Dict split across N shards, each guarded by its own lock.
+
+    A key always lives in shard `hash(key) % N`, so writers to different
+    shards never wait on each other and there is no single global lock.
+    Check-then-act operations like `insert_if_absent` run under the shard
+    lock, which makes them atomic even when handlers run in a thread pool.
+
+    Single-key reads take no lock: a dict lookup is atomic in CPython, and a
+    reader only ever sees a key before or after a write.
+    """
+
+    def __init__(self, shards: int = DEFAULT_SHARDS):
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        self._shards: List[_Shard] = [_Shard() for _ in range(shards)]
+
+    def _shard(self, key: K) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    # Store `value` under `key` unless the key is already taken, returns True when it was stored
+    def insert_if_absent(self, key: K, value: V) -> bool:
+        shard = self._shard(key)
+        with shard.lock:
+            if key in shard.data:
+                return False
+            shard.data[key] = value
+            return True
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        return self._shard(key).data.get(key, default)
+
+    def set(self, key: K, value: V):
+        shard = self._shard(key)
+        with shard.lock:
+            shard.data[key] = value
+
+    # Remove a key, returns its value or `default` when it was not there
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        shard = self._shard(key)
+        with shard.lock:
+            return shard.data.pop(key, default)
+
+    # Snapshot of all entries, each shard copied under its own lock
+    def items(self) -> List[Tuple[K, V]]:
+        entries: List[Tuple[K, V]] = []
+        for shard in self._shards:
+            with shard.lock:
+                entries.extend(shard.data.items())
+        return entries
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._shard(key).data
+
+    def __getitem__(self, key: K) -> V:
+        return self._shard(key).data[key]
+
+    def __setitem__(self, key: K, value: V):
+        self.set(key, value)
+
+    def __iter__(self) -> Iterator[K]:
+        return iter([key for key, _ in self.items()])
+
+    def __len__(self) -> int:
+        return sum(len(shard.data) for shard in self._shards)
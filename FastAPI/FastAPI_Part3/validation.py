@@ -0,0 +1,135 @@
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Annotated, Any, Dict, List, Optional, Tuple, Type
+
+import email_validator
+from email_validator.syntax import validate_email_domain_name, validate_email_local_part
+from pydantic import BaseModel, TypeAdapter, ValidationError, WithJsonSchema, create_model, field_validator
+from pydantic.functional_validators import AfterValidator
+from pydantic.networks import validate_email
+from pydantic_core import PydanticCustomError
+
+# Longest address email-validator accepts (RFC 5321 path limit minus the angle brackets)
+MAX_EMAIL_LENGTH = 254
+
+# Unquoted ASCII local part (RFC 5322 atext and dots) and a plain ASCII host name
+SIMPLE_EMAIL = re.compile(r"[A-Za-z0-9.!#$%&'*+/=?^_`{|}~-]+@[A-Za-z0-9.-]+")
+
+
+def _invalid_email(reason: str) -> PydanticCustomError:
+    # Same error type and message as pydantic's EmailStr
+    return PydanticCustomError(
+        "value_error", "value is not a valid email address: {reason}", {"reason": reason}
+    )
+
+
+# Normalised form of an email domain, cached because most users share a handful of domains.
+# Returns (domain, None) when valid or (None, reason) when not, so failures are cached too.
+@lru_cache(maxsize=4096)
+def normalize_email_domain(domain: str) -> Tuple[Optional[str], Optional[str]]:
+    try:
+        return validate_email_domain_name(domain)["domain"], None
+    except email_validator.EmailNotValidError as exc:
+        return None, str(exc)
+
+
+# Validate and normalise an email address the way EmailStr does, reusing cached domain results.
+# Only plain ASCII `local@domain` addresses take the fast path; anything unusual (display names,
+# quoted local parts, IP literals, unicode, stray characters) goes through pydantic's own validator.
+def normalize_email(value: str) -> str:
+    if len(value) <= MAX_EMAIL_LENGTH and SIMPLE_EMAIL.fullmatch(value):
+        local, _, domain = value.partition("@")
+        try:
+            local = validate_email_local_part(local)["local_part"]
+        except email_validator.EmailNotValidError as exc:
+            raise _invalid_email(str(exc)) from exc
+        normalized_domain, reason = normalize_email_domain(domain)
+        if reason is not None:
+            raise _invalid_email(reason)
+        return f"{local}@{normalized_domain}"
+    return validate_email(value)[1]
+
+
+# Drop-in replacement for EmailStr that validates through normalize_email
+CachedEmailStr = Annotated[
+    str,
+    AfterValidator(normalize_email),
+    WithJsonSchema({"type": "string", "format": "email"}),
+]
+
+
+class FieldCostStats:
+    """Total time and call count spent validating each field, across threads."""
+
+    def __init__(self):
+        self._costs: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, field: str, seconds: float):
+        with self._lock:
+            cost = self._costs.setdefault(field, [0, 0.0])
+            cost[0] += 1
+            cost[1] += seconds
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            costs = {field: tuple(cost) for field, cost in self._costs.items()}
+        return {
+            field: {
+                "count": count,
+                "total_ms": round(total * 1000, 3),
+                "mean_us": round(total / count * 1_000_000, 2),
+            }
+            # Most expensive fields first
+            for field, (count, total) in sorted(costs.items(), key=lambda item: -item[1][1])
+        }
+
+    def reset(self):
+        with self._lock:
+            self._costs.clear()
+
+
+# Subclass of `model` that records how long each field takes to validate, including its
+# validators. Nested models are timed too, reported as "parent.child".
+def timed_model(model: Type[BaseModel], stats: FieldCostStats, prefix: str = "") -> Type[BaseModel]:
+    def time_field(cls, value, handler, info):
+        start = time.perf_counter()
+        try:
+            return handler(value)
+        finally:
+            stats.record(prefix + info.field_name, time.perf_counter() - start)
+
+    nested = {
+        name: (timed_model(field.annotation, stats, f"{prefix}{name}."), field)
+        for name, field in model.model_fields.items()
+        if isinstance(field.annotation, type) and issubclass(field.annotation, BaseModel)
+    }
+    return create_model(
+        f"Timed{model.__name__}",
+        __base__=model,
+        __validators__={"time_field": field_validator("*", mode="wrap")(time_field)},
+        **nested,
+    )
+
+
+# Validate a parsed JSON array of objects in one pass through `adapter` (a TypeAdapter for a list).
+# Returns (index, item) for the valid items and, for each invalid one, its index and errors,
+# located in the request body the way FastAPI reports them: ("body", index, field, ...).
+# Raises the ValidationError when the payload as a whole is unusable (e.g. not a list).
+def validate_batch(adapter: TypeAdapter, items: Any) -> Tuple[List[Tuple[int, Any]], List[dict]]:
+    try:
+        return list(enumerate(adapter.validate_python(items))), []
+    except ValidationError as exc:
+        item_errors: Dict[int, List[dict]] = {}
+        for error in exc.errors(include_url=False, include_context=False, include_input=False):
+            if not error["loc"] or not isinstance(error["loc"][0], int):
+                raise
+            index = error["loc"][0]
+            item_errors.setdefault(index, []).append({**error, "loc": ("body", *error["loc"])})
+    # Second pass over the items that passed, now that the broken ones are known
+    indexes = [index for index in range(len(items)) if index not in item_errors]
+    valid = list(zip(indexes, adapter.validate_python([items[index] for index in indexes])))
+    errors = [{"index": index, "errors": item_errors[index]} for index in sorted(item_errors)]
+    return valid, errors
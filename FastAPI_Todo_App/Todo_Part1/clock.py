@@ -0,0 +1,58 @@
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Optional
+
+
+# Encode the current-time payload for one moment, formatted by hand instead of with strftime.
+# Encoded like FastAPI's JSONResponse, so the bytes match the response of a returned dict.
+def render_time(now: datetime) -> bytes:
+    return json.dumps({
+        "current_date": f"{now.year:04d}-{now.month:02d}-{now.day:02d}",
+        "current_time": f"{now.hour:02d}:{now.minute:02d}:{now.second:02d}",
+        "timezone": now.astimezone().tzname(),
+    }, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class CachedClock:
+    """Keeps the encoded current-time payload up to date on a fixed tick.
+
+    A background task re-renders the payload every `interval` seconds, so a
+    request only returns the cached bytes. Values are at most one tick old;
+    the payload has one-second resolution, so a 100 ms tick is usually exact.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._refresh()
+
+    def _refresh(self):
+        self.payload = render_time(datetime.now())
+        self._rendered_at = time.monotonic()
+
+    # Cached payload; re-rendered here if the ticker is not running (e.g. the app was started without lifespan)
+    def current(self) -> bytes:
+        if self._task is None and time.monotonic() - self._rendered_at >= self.interval:
+            self._refresh()
+        return self.payload
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self._refresh()
+
+    def start(self):
+        if self._task is None:
+            self._refresh()
+            self._task = asyncio.get_running_loop().create_task(self._tick())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,18 +1,29 @@
+from contextlib import asynccontextmanager
 from datetime import datetime
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 
-app = FastAPI()
+from clock import CachedClock, render_time
+
+# Pre-formatted current time, refreshed every 100 ms instead of on every request
+clock = CachedClock(interval=0.1)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    clock.start()
+    yield
+    await clock.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Todo App!"}
 
+# Current date, time and timezone; up to 100 ms old unless precise=true asks for the exact time
 @app.get("/current-time")
-async def get_current_time():
-    current_time = datetime.now()
-    return {
-        "current_date": current_time.strftime("%Y-%m-%d"),
-        "current_time": current_time.strftime("%H:%M:%S"),
-        "timezone": current_time.astimezone().tzname()
-    }
+async def get_current_time(precise: bool = False):
+    payload = render_time(datetime.now()) if precise else clock.current()
+    return Response(content=payload, media_type="application/json")
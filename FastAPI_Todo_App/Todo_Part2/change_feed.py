@@ -0,0 +1,45 @@
+import asyncio
+import threading
+from typing import List, Tuple
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ChangeNotifier:
+    """Wakes up long-poll and SSE requests waiting for the next todo change.
+
+    Writes happen in the thread pool that runs the sync route handlers, while
+    waiters are coroutines on the event loop, so waking them goes through
+    `call_soon_threadsafe`. Only writes made by this worker are seen here;
+    waiters still re-check the repository every so often to pick up changes
+    written by other workers to a shared database.
+    """
+
+    def __init__(self):
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._lock = threading.Lock()
+
+    # Wake up everyone currently waiting
+    def notify(self):
+        with self._lock:
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    # Wait until the next notify() or until `timeout` seconds have passed
+    async def wait(self, timeout: float):
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._lock:
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
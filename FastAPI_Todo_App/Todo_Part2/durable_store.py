@@ -0,0 +1,529 @@
+import array
+import gc
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from itertools import accumulate, compress, repeat
+from typing import Iterable, List, Optional, Tuple
+
+from repository import TodoFilter, TodoRecord
+from store import TodoStore
+from todo_ids import TODO_ID_SIZE, TodoId
+
+logger = logging.getLogger(__name__)
+
+# Data directory layout:
+#   todos.snapshot   every todo as of some moment, plus the first log generation to replay
+#   todos.log.<gen>  frames appended after that moment, one file per generation
+SNAPSHOT_NAME = "todos.snapshot"
+LOG_PREFIX = "todos.log."
+
+# Log frame: body length and CRC32, then the body: op and change time, then the todo (or only its id)
+FRAME_HEADER = struct.Struct("<II")
+FRAME_OP = struct.Struct("<Bq")
+OP_PUT = 1
+OP_DELETE = 2
+# Fixed part of an encoded todo: id, created/updated in microseconds, version, completed,
+# title and description lengths in bytes (-1 for no description), followed by the UTF-8 text
+RECORD = struct.Struct("<16sqqq?ii")
+
+# Snapshot: header, then one column per field so loading is a few bulk copies, then a CRC32 of it all
+SNAPSHOT_MAGIC = b"TODOSNP1"
+SNAPSHOT_HEADER = struct.Struct("<8sQQqQ")
+
+# Naive local datetimes are stored as microseconds since this moment, which round-trips exactly
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+# Titles typed by clients may hold lone surrogates, which strict UTF-8 rejects
+TEXT_ERRORS = "surrogatepass"
+
+
+def to_micros(value: datetime) -> int:
+    return (value - EPOCH) // ONE_MICROSECOND
+
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+
+def log_path(directory: str, generation: int) -> str:
+    return os.path.join(directory, f"{LOG_PREFIX}{generation:08d}")
+
+
+# Generations of the log files in `directory`, oldest first
+def log_generations(directory: str) -> List[int]:
+    return sorted(
+        int(name[len(LOG_PREFIX):])
+        for name in os.listdir(directory)
+        if name.startswith(LOG_PREFIX) and name[len(LOG_PREFIX):].isdigit()
+    )
+
+
+# Make a rename or a new file in `directory` survive a crash
+def fsync_directory(directory: str):
+    if sys.platform == "win32":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def encode_frame(op: str, todo: TodoRecord, changed_at: datetime) -> bytes:
+    if op == "deleted":
+        body = FRAME_OP.pack(OP_DELETE, to_micros(changed_at)) + todo.id
+    else:
+        title = todo.title.encode("utf-8", TEXT_ERRORS)
+        description = b"" if todo.description is None else todo.description.encode("utf-8", TEXT_ERRORS)
+        body = b"".join((
+            FRAME_OP.pack(OP_PUT, to_micros(changed_at)),
+            RECORD.pack(
+                todo.id,
+                to_micros(todo.created_at),
+                to_micros(todo.updated_at),
+                todo.version,
+                todo.completed,
+                len(title),
+                -1 if todo.description is None else len(description),
+            ),
+            title,
+            description,
+        ))
+    return FRAME_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+
+def decode_record(body: bytes, offset: int) -> TodoRecord:
+    todo_id, created, updated, version, completed, title_size, description_size = RECORD.unpack_from(body, offset)
+    offset += RECORD.size
+    title = body[offset:offset + title_size].decode("utf-8", TEXT_ERRORS)
+    offset += title_size
+    description = None
+    if description_size >= 0:
+        description = body[offset:offset + description_size].decode("utf-8", TEXT_ERRORS)
+    return TodoRecord(
+        todo_id, title, description, completed, from_micros(created), from_micros(updated), version
+    )
+
+
+def _column(values: Iterable[int]) -> bytes:
+    column = array.array("q", values)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column.tobytes()
+
+
+def _read_column(buffer, offset: int, count: int) -> Tuple[array.array, int]:
+    column = array.array("q")
+    end = offset + count * column.itemsize
+    column.frombytes(buffer[offset:end])
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column, end
+
+
+# Write `todos` (in (created_at, id) order) as a snapshot from which the log `generation` is replayed
+def write_snapshot(
+    path: str, generation: int, version: int, last_modified: datetime, todos: List[TodoRecord]
+):
+    titles = [todo.title for todo in todos]
+    descriptions = [todo.description for todo in todos]
+    # Lengths are in characters: the text is decoded once on load and sliced
+    text = ("".join(titles) + "".join(filter(None, descriptions))).encode("utf-8", TEXT_ERRORS)
+    parts = [
+        SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, generation, version, to_micros(last_modified), len(todos)),
+        b"".join([todo.id for todo in todos]),
+        _column([to_micros(todo.created_at) for todo in todos]),
+        _column([to_micros(todo.updated_at) for todo in todos]),
+        _column([todo.version for todo in todos]),
+        bytes([todo.completed for todo in todos]),
+        _column(map(len, titles)),
+        _column([-1 if description is None else len(description) for description in descriptions]),
+        _column([len(text)]),
+        text,
+    ]
+    crc = 0
+    for part in parts:
+        crc = zlib.crc32(part, crc)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.writelines(parts)
+        f.write(struct.pack("<I", crc))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_directory(os.path.dirname(path) or ".")
+
+
+# Read a snapshot through mmap: returns (log generation, version, last modified, todos in key order)
+def read_snapshot(path: str) -> Tuple[int, int, datetime, List[TodoRecord]]:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            (stored_crc,) = struct.unpack_from("<I", mm, len(mm) - 4)
+            if zlib.crc32(view[:-4]) != stored_crc:
+                raise ValueError(f"Snapshot {path} is corrupt")
+            magic, generation, version, last_modified, count = SNAPSHOT_HEADER.unpack_from(mm, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} is not a todo snapshot")
+            offset = SNAPSHOT_HEADER.size
+            id_bytes = mm[offset:offset + count * TODO_ID_SIZE]
+            offset += count * TODO_ID_SIZE
+            created, offset = _read_column(mm, offset, count)
+            updated, offset = _read_column(mm, offset, count)
+            versions, offset = _read_column(mm, offset, count)
+            completed = list(map(bool, mm[offset:offset + count]))
+            offset += count
+            title_sizes, offset = _read_column(mm, offset, count)
+            description_sizes, offset = _read_column(mm, offset, count)
+            (text_size,), offset = _read_column(mm, offset, 1)
+            text = str(view[offset:offset + text_size], "utf-8", TEXT_ERRORS)
+        finally:
+            view.release()
+
+    ids = [id_bytes[i:i + TODO_ID_SIZE] for i in range(0, len(id_bytes), TODO_ID_SIZE)]
+    ends = list(accumulate(title_sizes))
+    titles = [text[end - size:end] for size, end in zip(title_sizes, ends)]
+    position = ends[-1] if ends else 0
+    descriptions = []
+    for size in description_sizes:
+        if size < 0:
+            descriptions.append(None)
+        else:
+            descriptions.append(text[position:position + size])
+            position += size
+    created_at = list(map(EPOCH.__add__, map(timedelta, repeat(0), repeat(0), created)))
+    # Never-updated todos share the created_at object, like freshly created records do
+    updated_at = [
+        created_value if micros == created_micros else from_micros(micros)
+        for created_value, created_micros, micros in zip(created_at, created, updated)
+    ]
+    todos = list(map(TodoRecord, ids, titles, descriptions, completed, created_at, updated_at, versions))
+    return generation, version, from_micros(last_modified), todos
+
+
+class WriteAheadLog:
+    """Append-only log file written by one background thread with group commit.
+
+    `append` only queues a frame. The writer thread writes everything queued
+    since its last pass in one write and one fsync, so concurrent writers
+    share an fsync instead of paying for one each. `wait(seq)` blocks until
+    the frame numbered `seq` is on disk.
+    """
+
+    def __init__(self, directory: str, generation: int, size: int = 0):
+        self.directory = directory
+        self.appended = 0
+        # Log bytes a snapshot would make redundant, used to decide when to take one
+        self.size = size
+        self._durable = 0
+        self._pending: list = []
+        self._closed = False
+        self._error: Optional[OSError] = None
+        self._cond = threading.Condition()
+        self._file = open(log_path(directory, generation), "ab", buffering=0)
+        fsync_directory(directory)
+        self._thread = threading.Thread(target=self._run, name="todo-log-writer", daemon=True)
+        self._thread.start()
+
+    # Queue a frame, returns its sequence number for `wait`
+    def append(self, frame: bytes) -> int:
+        with self._cond:
+            self._pending.append(frame)
+            self.appended += 1
+            self.size += len(frame)
+            self._cond.notify_all()
+            return self.appended
+
+    # Frames appended after this call go to the log file of `generation`
+    def rotate(self, generation: int):
+        with self._cond:
+            self._pending.append(generation)
+            self.size = 0
+            self._cond.notify_all()
+
+    def wait(self, seq: int):
+        with self._cond:
+            while self._durable < seq:
+                if self._error is not None:
+                    raise self._error
+                self._cond.wait()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._file.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+                target = self.appended
+            try:
+                self._write(batch)
+            except OSError as exc:
+                with self._cond:
+                    self._error = exc
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._durable = target
+                self._cond.notify_all()
+
+    def _write(self, batch: list):
+        frames = []
+        for item in batch:
+            if isinstance(item, int):
+                self._file.write(b"".join(frames))
+                frames = []
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = open(log_path(self.directory, item), "ab", buffering=0)
+                fsync_directory(self.directory)
+            else:
+                frames.append(item)
+        if frames:
+            self._file.write(b"".join(frames))
+        getattr(os, "fdatasync", os.fsync)(self._file.fileno())
+
+
+class DurableTodoStore(TodoStore):
+    """In-memory todo store that survives restarts, without a database.
+
+    Every change is appended to a write-ahead log (see `WriteAheadLog`) and
+    a background thread periodically writes a columnar snapshot of all todos,
+    after which older log files are deleted. On startup the snapshot is
+    loaded in bulk and only the log written after it is replayed, both read
+    through mmap; a torn frame at the end of the log (a crash mid-write) ends
+    the replay.
+
+    With `wait_for_sync`, write methods return once their change is on disk;
+    otherwise they return right away and a crash can lose the last few
+    milliseconds of writes.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        snapshot_interval: float = 60.0,
+        snapshot_log_bytes: int = 64 * 1024 * 1024,
+        wait_for_sync: bool = True,
+    ):
+        super().__init__()
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_log_bytes = snapshot_log_bytes
+        self.wait_for_sync = wait_for_sync
+        # The word index is rebuilt on the first text search after a restart, not while loading
+        self._text_indexed = True
+        os.makedirs(directory, exist_ok=True)
+        # Loading creates millions of objects and no garbage, so the cyclic collector would only slow it down
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._generation, replayed = self._recover()
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self._wal = WriteAheadLog(directory, self._generation, size=replayed)
+        self._snapshot_lock = threading.Lock()
+        self._last_snapshot = time.monotonic()
+        self._stop = threading.Event()
+        self._snapshotter = threading.Thread(target=self._snapshot_loop, name="todo-snapshot", daemon=True)
+        self._snapshotter.start()
+
+    def add(self, todo: TodoRecord) -> TodoRecord:
+        todo = super().add(todo)
+        self._sync()
+        return todo
+
+    def update(self, todo_id: TodoId, **fields) -> Optional[TodoRecord]:
+        todo = super().update(todo_id, **fields)
+        self._sync()
+        return todo
+
+    def delete(self, todo_id: TodoId) -> Optional[TodoRecord]:
+        todo = super().delete(todo_id)
+        self._sync()
+        return todo
+
+    def add_many(self, todos: Iterable[TodoRecord]) -> List[TodoRecord]:
+        added = super().add_many(todos)
+        self._sync()
+        return added
+
+    def update_many(self, updates: Iterable[Tuple[TodoId, dict]]) -> List[Optional[TodoRecord]]:
+        updated = super().update_many(updates)
+        self._sync()
+        return updated
+
+    def delete_many(self, todo_ids: Iterable[TodoId]) -> List[Optional[TodoRecord]]:
+        deleted = super().delete_many(todo_ids)
+        self._sync()
+        return deleted
+
+    # Write a snapshot now and drop the log files it replaces
+    def snapshot(self):
+        with self._snapshot_lock:
+            with self._lock:
+                # Changes from here on go to a new log file. The capture must hold exactly the changes
+                # logged before it, since replaying a frame twice would count its version twice: it does,
+                # because every change is logged under this lock and stored records are never modified.
+                # A log with nothing since its last rotation (e.g. after a failed snapshot) is kept as is
+                if self._wal.size:
+                    self._generation += 1
+                    self._wal.rotate(self._generation)
+                generation, version, last_modified = self._generation, self._version, self._last_modified
+                keys = self._keys.copy()
+                todos = self._todos.copy()
+            write_snapshot(
+                os.path.join(self.directory, SNAPSHOT_NAME),
+                generation,
+                version,
+                last_modified,
+                [todos[todo_id] for _, todo_id in keys],
+            )
+            self._last_snapshot = time.monotonic()
+            self._remove_logs_before(generation)
+
+    def close(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._snapshotter.join()
+        # Leave a fresh snapshot so the next start has no log to replay
+        if self._wal.size:
+            self.snapshot()
+        self._wal.close()
+
+    def _sync(self):
+        if self.wait_for_sync:
+            self._wal.wait(self._wal.appended)
+
+    def _touch(self, op: str, todo: TodoRecord, changed_at: Optional[datetime] = None):
+        super()._touch(op, todo, changed_at)
+        self._wal.append(encode_frame(op, todo, self._last_modified))
+
+    def _snapshot_loop(self):
+        retry = False
+        while not self._stop.wait(1.0):
+            size = self._wal.size
+            if retry or size >= self.snapshot_log_bytes or (
+                size and time.monotonic() - self._last_snapshot >= self.snapshot_interval
+            ):
+                try:
+                    self.snapshot()
+                    retry = False
+                except OSError:
+                    # e.g. a full disk; the logs still hold every change, so try again on the next tick
+                    logger.exception("Writing the todo snapshot to %s failed", self.directory)
+                    retry = True
+
+    # Load the snapshot and replay newer logs, returns the generation to append to and the bytes replayed
+    def _recover(self) -> Tuple[int, int]:
+        first_generation = 1
+        path = os.path.join(self.directory, SNAPSHOT_NAME)
+        if os.path.exists(path):
+            first_generation, self._version, self._last_modified, todos = read_snapshot(path)
+            self._load(todos)
+        self._remove_logs_before(first_generation)
+        generations = log_generations(self.directory)
+        if not generations:
+            return first_generation, 0
+        sizes = [self._replay(log_path(self.directory, generation)) for generation in generations]
+        # Keep appending to the newest log rather than starting a new file on every restart,
+        # after cutting off a frame torn by a crash so new frames are not hidden behind it
+        last = generations[-1]
+        with open(log_path(self.directory, last), "r+b") as f:
+            if os.fstat(f.fileno()).st_size > sizes[-1]:
+                f.truncate(sizes[-1])
+                os.fsync(f.fileno())
+        return last, sum(sizes)
+
+    # Fill the indexes from snapshot todos, which are already in key order
+    def _load(self, todos: List[TodoRecord]):
+        ids = [todo.id for todo in todos]
+        completed = [todo.completed for todo in todos]
+        self._todos = dict(zip(ids, todos))
+        self._keys = list(zip([todo.created_at for todo in todos], ids))
+        done = set(compress(ids, completed))
+        self._by_completed = {True: done, False: set(ids) - done}
+        self._by_token = {}
+        self._text_indexed = not todos
+
+    # Apply the frames of one log file, returns the bytes applied
+    def _replay(self, path: str) -> int:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                offset = 0
+                while offset + FRAME_HEADER.size <= size:
+                    length, crc = FRAME_HEADER.unpack_from(mm, offset)
+                    start = offset + FRAME_HEADER.size
+                    body = mm[start:start + length]
+                    if len(body) < length or zlib.crc32(body) != crc:
+                        break
+                    self._apply(body)
+                    offset = start + length
+        return offset
+
+    def _apply(self, body: bytes):
+        op, changed_at = FRAME_OP.unpack_from(body, 0)
+        if op == OP_PUT:
+            todo = decode_record(body, FRAME_OP.size)
+            todo_id = todo.id
+        else:
+            todo, todo_id = None, body[FRAME_OP.size:FRAME_OP.size + TODO_ID_SIZE]
+        old = self._todos.get(todo_id)
+        if old is None:
+            if todo is not None:
+                self._todos[todo_id] = todo
+                self._index(todo)
+        elif todo is None:
+            del self._todos[todo_id]
+            self._unindex(old)
+        else:
+            # An update keeps the (created_at, id) key, so only the other indexes change;
+            # assigning to the existing dict key keeps the todo's place in creation order
+            self._by_completed[bool(old.completed)].discard(todo_id)
+            self._unindex_text(old)
+            self._todos[todo_id] = todo
+            self._by_completed[bool(todo.completed)].add(todo_id)
+            self._index_text(todo)
+        self._version += 1
+        self._last_modified = from_micros(changed_at)
+
+    def _remove_logs_before(self, generation: int):
+        for old in log_generations(self.directory):
+            if old < generation:
+                os.remove(log_path(self.directory, old))
+
+    def _candidates(self, filters: Optional[TodoFilter]):
+        if filters is not None and filters.text and not self._text_indexed:
+            for todo in self._todos.values():
+                super()._index_text(todo)
+            self._text_indexed = True
+        return super()._candidates(filters)
+
+    def _index_text(self, todo: TodoRecord):
+        if self._text_indexed:
+            super()._index_text(todo)
+
+    def _unindex_text(self, todo: TodoRecord):
+        if self._text_indexed:
+            super()._unindex_text(todo)
@@ -1,37 +1,124 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import base64
+import binascii
+import gc
+import logging
+import os
+import sys
+from contextlib import asynccontextmanager
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Body, FastAPI, HTTPException, Query, Request, Response
 from pydantic import BaseModel
 from typing import List, Optional
-from datetime import datetime
-from uuid import uuid4
-from fastapi.responses import JSONResponse
-
-app = FastAPI()
-
-# In-memory database (list) for todos with some initial example items
-todos = [
-    {
-        "id": str(uuid4()),
-        "title": "Learn FastAPI",
-        "description": "Go through the official FastAPI documentation and tutorials.",
-        "completed": False,
-        "created_at": datetime.now(),
-    },
-    {
-        "id": str(uuid4()),
-        "title": "Build a Todo API",
-        "description": "Create a REST API for managing todo items using FastAPI.",
-        "completed": False,
-        "created_at": datetime.now(),
-    },
-    {
-        "id": str(uuid4()),
-        "title": "Write blog post",
-        "description": "Draft a blog post about creating a Todo API with FastAPI.",
-        "completed": False,
-        "created_at": datetime.now(),
-    },
+from datetime import datetime, timezone
+from pathlib import Path
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from change_feed import ChangeNotifier
+from repository import TodoFilter, TodoRecord, create_repository
+from serialization import TodoJSONResponse, dumps
+from todo_ids import TodoId, format_todo_id, new_todo_id, parse_todo_id
+
+# Shared performance helpers live in fastapi_perf/ at the repository root
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from fastapi_perf.limits import install_admission_control  # noqa: E402
+from fastapi_perf.metrics import install_metrics_from_env  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+# Command line of `python main.py`, see the end of this file
+def parse_run_args():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the Todo API")
+    parser.add_argument("--host", default=os.getenv("TODO_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("TODO_PORT", "8000")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("TODO_WORKERS", "1")),
+        help="worker processes, 0 for one per CPU core",
+    )
+    args = parser.parse_args()
+    args.workers = args.workers or os.cpu_count() or 1
+    return args
+
+
+# Parsed first when run as a script, so the storage below is only built where requests are served
+RUN_ARGS = parse_run_args() if __name__ == "__main__" else None
+RUN_WORKERS = RUN_ARGS.workers if RUN_ARGS is not None else 1
+
+# Todo storage: in-memory by default, or a shared SQLite file with TODO_BACKEND=sqlite
+TODO_BACKEND = os.getenv("TODO_BACKEND", "memory")
+if RUN_WORKERS > 1 and TODO_BACKEND != "sqlite":
+    logger.warning("Several workers cannot share %s todos, using TODO_BACKEND=sqlite", TODO_BACKEND)
+    TODO_BACKEND = os.environ["TODO_BACKEND"] = "sqlite"
+# The process starting several workers serves no requests itself, so only the workers build the storage
+todos = create_repository(TODO_BACKEND) if RUN_WORKERS == 1 else None
+
+# Wakes up change feed clients after this worker writes a todo
+change_notifier = ChangeNotifier()
+
+
+# Runs once per worker: warm the storage before serving requests, release it after the last one
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(todos.warm_up)
+    # Everything loaded so far lives as long as the worker; keep the cyclic GC from walking it again
+    gc.freeze()
+    yield
+    await run_in_threadpool(todos.close)
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Per-route timing histograms on /metrics when ENABLE_METRICS=1
+install_metrics_from_env(app)
+
+# Sheds load with 503 past 256 in-flight requests and rate-limits writes per client with 429.
+# Change feeds stay open for long, so they are exempt instead of holding a slot each.
+admission = install_admission_control(app, exempt=("/todos/changes",))
+admission.limit("POST", "/todos/", rate=50, burst=100)
+admission.limit("POST", "/todos/batch", rate=5, burst=10)
+admission.limit("PATCH", "/todos/batch", rate=5, burst=10)
+admission.limit("DELETE", "/todos/batch", rate=5, burst=10)
+
+# How often change feed clients re-check storage for writes made by other workers, and send SSE keep-alives
+CHANGE_POLL_INTERVAL = 1.0
+SSE_KEEP_ALIVE_INTERVAL = 15.0
+
+# Some initial example items
+example_todos = [
+    TodoRecord(
+        id=new_todo_id(),
+        title="Learn FastAPI",
+        description="Go through the official FastAPI documentation and tutorials.",
+        completed=False,
+        created_at=datetime.now(),
+    ),
+    TodoRecord(
+        id=new_todo_id(),
+        title="Build a Todo API",
+        description="Create a REST API for managing todo items using FastAPI.",
+        completed=False,
+        created_at=datetime.now(),
+    ),
+    TodoRecord(
+        id=new_todo_id(),
+        title="Write blog post",
+        description="Draft a blog post about creating a Todo API with FastAPI.",
+        completed=False,
+        created_at=datetime.now(),
+    ),
 ]
 
+# Only seed the in-memory store, a persistent database keeps its own data across restarts
+if TODO_BACKEND == "memory":
+    for example_todo in example_todos:
+        todos.add(example_todo)
+
 
 # TodoCreate model for input validation
 class TodoCreate(BaseModel):
@@ -47,64 +134,336 @@ class Todo(BaseModel):
     description: Optional[str] = None
     completed: bool
     created_at: datetime
+    updated_at: datetime
+    version: int
+
+
+# TodoUpdate model for partial updates in a batch, unset fields are left unchanged
+class TodoUpdate(BaseModel):
+    id: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    completed: Optional[bool] = None
+
+    # Fields to change; title and completed can't be cleared, so a null there means "leave as is"
+    def changes(self) -> dict:
+        fields = self.dict(exclude_unset=True, exclude={"id"})
+        return {
+            name: value
+            for name, value in fields.items()
+            if value is not None or name == "description"
+        }
+
+
+# BatchResult model describing the outcome of one item in a batch request
+class BatchResult(BaseModel):
+    id: str
+    status: str
+    todo: Optional[Todo] = None
+
+
+# TodoChangeModel describing one entry of the change feed
+class TodoChangeModel(BaseModel):
+    seq: int
+    op: str
+    id: str
+    todo: Optional[Todo] = None
+    changed_at: datetime
+
+
+# ChangeFeed model returned by the long-poll endpoint
+class ChangeFeed(BaseModel):
+    changes: List[TodoChangeModel]
+    last_seq: int
+
+
+# Largest number of items accepted by the batch endpoints
+MAX_BATCH_SIZE = 1000
+
+
+# Helper function to turn an id from a request into its stored form.
+# Text that is not a valid id becomes an empty id, which matches no todo.
+def to_todo_id(todo_id: str) -> TodoId:
+    return parse_todo_id(todo_id) or b""
 
 
 # Helper function to find a todo by ID
 def get_todo_by_id(todo_id: str):
-    for todo in todos:
-        if todo["id"] == todo_id:
-            return todo
-    return None
+    return todos.get(to_todo_id(todo_id))
 
 
-# Create a new todo
-@app.post("/todos/", response_model=Todo)
-def create_todo(todo: TodoCreate):
-    new_todo = Todo(
-        id=str(uuid4()),
+# Helper functions to turn the (created_at, id) key of a todo into an opaque cursor and back
+def encode_cursor(todo: TodoRecord) -> str:
+    raw = f"{todo.created_at.isoformat()}|{format_todo_id(todo.id)}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, todo_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        key = datetime.fromisoformat(created_at), parse_todo_id(todo_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Cursors we hand out carry naive timestamps; an offset would not compare with stored ones
+    if key[1] is None or key[0].tzinfo is not None:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+
+# Helper function to compare query timestamps with created_at, which is stored as naive local time
+def to_local_time(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+# Helper function to build the ETag and Last-Modified headers for a version of a resource
+def cache_headers(etag: str, last_modified: datetime) -> dict:
+    return {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified.astimezone(timezone.utc), usegmt=True),
+    }
+
+
+# Helper function to build the ETag of the todo list; the store's epoch keeps versions from before a restart apart
+def collection_etag(version: int) -> str:
+    return f'"c{todos.epoch}-{version}"' if todos.epoch else f'"c{version}"'
+
+
+def todo_cache_headers(todo: TodoRecord) -> dict:
+    return cache_headers(f'"{format_todo_id(todo.id)}-{todo.version}"', todo.updated_at)
+
+
+# Helper function to check If-None-Match (or If-Modified-Since when there is no ETag) against the current version
+def is_not_modified(request: Request, headers: dict) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or headers["ETag"] in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return parsedate_to_datetime(headers["Last-Modified"]) <= since
+    return False
+
+
+# Serialize todos one at a time as newline-delimited JSON
+def stream_todos(after, limit: Optional[int], filters: Optional[TodoFilter]):
+    for todo in todos.iter_pages(after=after, limit=limit, filters=filters):
+        yield dumps(todo) + b"\n"
+
+
+# Helper function to build a new todo from the input data
+def build_todo(todo: TodoCreate) -> TodoRecord:
+    created_at = datetime.now()
+    return TodoRecord(
+        id=new_todo_id(created_at),
         title=todo.title,
         description=todo.description,
         completed=todo.completed,
-        created_at=datetime.now()
+        created_at=created_at
     )
-    todos.append(new_todo.dict())
-    return new_todo
 
 
-# Retrieve all todos
+# Helper function to reject batches that are too large
+def check_batch_size(items: list):
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413, detail=f"Batch is limited to {MAX_BATCH_SIZE} items"
+        )
+
+
+# Helper function to describe the outcome of one batch item
+def batch_result(todo_id: str, status: str, todo: Optional[TodoRecord] = None) -> dict:
+    return {"id": todo_id, "status": status, "todo": todo}
+
+
+# Create a new todo
+@app.post("/todos/", response_model=Todo)
+def create_todo(todo: TodoCreate):
+    new_todo = todos.add(build_todo(todo))
+    change_notifier.notify()
+    return TodoJSONResponse(new_todo, headers=todo_cache_headers(new_todo))
+
+
+# Create many todos in one request
+@app.post("/todos/batch", response_model=List[BatchResult])
+def create_todos_batch(todo_batch: List[TodoCreate]):
+    check_batch_size(todo_batch)
+    new_todos = todos.add_many([build_todo(todo) for todo in todo_batch])
+    change_notifier.notify()
+    return TodoJSONResponse([batch_result(format_todo_id(todo.id), "created", todo) for todo in new_todos])
+
+
+# Partially update many todos in one request, unknown ids are reported as not_found
+@app.patch("/todos/batch", response_model=List[BatchResult])
+def update_todos_batch(todo_batch: List[TodoUpdate]):
+    check_batch_size(todo_batch)
+    updated = todos.update_many(
+        (to_todo_id(todo.id), todo.changes()) for todo in todo_batch
+    )
+    change_notifier.notify()
+    return TodoJSONResponse([
+        batch_result(todo.id, "updated", result) if result else batch_result(todo.id, "not_found")
+        for todo, result in zip(todo_batch, updated)
+    ])
+
+
+# Delete many todos in one request, unknown ids are reported as not_found
+@app.delete("/todos/batch", response_model=List[BatchResult])
+def delete_todos_batch(todo_ids: List[str] = Body(...)):
+    check_batch_size(todo_ids)
+    deleted = todos.delete_many([to_todo_id(todo_id) for todo_id in todo_ids])
+    change_notifier.notify()
+    return TodoJSONResponse([
+        batch_result(todo_id, "deleted" if result else "not_found")
+        for todo_id, result in zip(todo_ids, deleted)
+    ])
+
+
+# Retrieve all todos, optionally filtered, a page at a time or streamed as NDJSON
 @app.get("/todos/", response_model=List[Todo])
-def get_all_todos():
-    return todos
+def get_all_todos(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    completed: Optional[bool] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    q: Optional[str] = Query(None, description="Words that must all appear in the title or description"),
+):
+    after = decode_cursor(cursor) if cursor else None
+    filters = None
+    if completed is not None or created_after or created_before or q:
+        filters = TodoFilter(
+            completed=completed,
+            created_after=to_local_time(created_after),
+            created_before=to_local_time(created_before),
+            text=q,
+        )
+    if stream:
+        return StreamingResponse(
+            stream_todos(after, limit, filters), media_type="application/x-ndjson"
+        )
+    # Any write changes the collection version, so an unchanged version means an unchanged list
+    version, last_modified = todos.collection_version()
+    headers = cache_headers(collection_etag(version), last_modified)
+    if is_not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    if limit is None and after is None and filters is None:
+        return TodoJSONResponse(todos.all(), headers=headers)
+    # Fetch one extra todo to know whether there is a next page
+    page = todos.page(
+        after=after, limit=limit + 1 if limit is not None else None, filters=filters
+    )
+    if limit is not None and len(page) > limit:
+        page = page[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(page[-1])
+    return TodoJSONResponse(page, headers=headers)
+
+
+# Helper function to read changes after `since`, a 410 tells the client to reload the full list
+async def read_changes(since: int, limit: int):
+    changes = await run_in_threadpool(todos.changes_since, since, limit)
+    if changes is None:
+        raise HTTPException(
+            status_code=410, detail="Changes since this seq are no longer available, reload the todos"
+        )
+    return changes
+
+
+# Long-poll for changes after `since`, waiting up to `timeout` seconds when there are none yet
+@app.get("/todos/changes", response_model=ChangeFeed)
+async def get_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    timeout: float = Query(30, ge=0, le=60),
+):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    changes = await read_changes(since, limit)
+    while not changes and loop.time() < deadline:
+        await change_notifier.wait(min(deadline - loop.time(), CHANGE_POLL_INTERVAL))
+        changes = await read_changes(since, limit)
+    last_seq = changes[-1].seq if changes else since
+    return TodoJSONResponse({"changes": changes, "last_seq": last_seq})
+
+
+# Server-Sent Events for every change after `since`
+async def change_events(request: Request, since: int):
+    loop = asyncio.get_running_loop()
+    last_sent = loop.time()
+    while not await request.is_disconnected():
+        changes = await run_in_threadpool(todos.changes_since, since, 100)
+        if changes is None:
+            # The client fell too far behind, it has to reload the todos and reconnect
+            yield b"event: reset\ndata: {}\n\n"
+            return
+        for change in changes:
+            yield b"id: %d\nevent: %s\ndata: %s\n\n" % (change.seq, change.op.encode(), dumps(change))
+        if changes:
+            since, last_sent = changes[-1].seq, loop.time()
+            continue
+        if loop.time() - last_sent >= SSE_KEEP_ALIVE_INTERVAL:
+            yield b": keep-alive\n\n"
+            last_sent = loop.time()
+        await change_notifier.wait(CHANGE_POLL_INTERVAL)
+
+
+# Stream changes as Server-Sent Events, resuming from `since` or the Last-Event-ID header
+@app.get("/todos/changes/stream")
+async def stream_changes(request: Request, since: Optional[int] = Query(None, ge=0)):
+    last_event_id = request.headers.get("last-event-id", "")
+    if since is None and last_event_id.isdigit():
+        since = int(last_event_id)
+    if since is None:
+        since = await run_in_threadpool(todos.last_change_seq)
+    return StreamingResponse(
+        change_events(request, since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
 
 
 # Retrieve a single todo by ID
 @app.get("/todos/{todo_id}", response_model=Todo)
-def get_todo(todo_id: str):
+def get_todo(todo_id: str, request: Request):
     todo = get_todo_by_id(todo_id)
     if not todo:
         raise HTTPException(status_code=404, detail="Todo not found")
-    return todo
+    headers = todo_cache_headers(todo)
+    if is_not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    return TodoJSONResponse(todo, headers=headers)
 
 
 # Update an existing todo
 @app.put("/todos/{todo_id}", response_model=Todo)
 def update_todo(todo_id: str, todo_data: TodoCreate):
-    todo = get_todo_by_id(todo_id)
+    todo = todos.update(
+        to_todo_id(todo_id),
+        title=todo_data.title,
+        description=todo_data.description,
+        completed=todo_data.completed,
+    )
     if not todo:
         raise HTTPException(status_code=404, detail="Todo not found")
-    todo["title"] = todo_data.title
-    todo["description"] = todo_data.description
-    todo["completed"] = todo_data.completed
-    return Todo(**todo)
+    change_notifier.notify()
+    return TodoJSONResponse(todo, headers=todo_cache_headers(todo))
 
 
 # Delete a todo
 @app.delete("/todos/{todo_id}")
 def delete_todo(todo_id: str):
-    todo = get_todo_by_id(todo_id)
-    if not todo:
+    if not todos.delete(to_todo_id(todo_id)):
         raise HTTPException(status_code=404, detail="Todo not found")
-    todos.remove(todo)
+    change_notifier.notify()
     return {"detail": "Todo deleted successfully"}
 
 
@@ -122,7 +481,24 @@ def http_exception_handler(request, exc: HTTPException):
     )
 
 
+# Production launch: `python main.py --workers 4` runs one process per worker.
+# Workers do not share memory, so with more than one they share an SQLite file instead.
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Change feed streams never end on their own, give them a moment then close them
+    shutdown_timeout = 10
+    if RUN_WORKERS == 1:
+        uvicorn.run(
+            app, host=RUN_ARGS.host, port=RUN_ARGS.port, timeout_graceful_shutdown=shutdown_timeout
+        )
+    else:
+        # Workers import the app themselves, so it is passed by name
+        uvicorn.run(
+            "main:app",
+            app_dir=str(Path(__file__).resolve().parent),
+            host=RUN_ARGS.host,
+            port=RUN_ARGS.port,
+            workers=RUN_WORKERS,
+            timeout_graceful_shutdown=shutdown_timeout,
+        )
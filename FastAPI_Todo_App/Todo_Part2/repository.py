@@ -0,0 +1,208 @@
+import os
+import re
+import unicodedata
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from todo_ids import TodoId
+
+# Sort key used for keyset pagination: (created_at, id)
+TodoKey = Tuple[datetime, TodoId]
+
+# Letters and digits, "_" separates tokens like in SQLite FTS5's default unicode61 tokenizer
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+@dataclass(slots=True)
+class TodoRecord:
+    """Stored form of a todo: a slotted record is smaller and faster to read than a dict."""
+
+    id: TodoId
+    title: str
+    description: Optional[str]
+    completed: bool
+    created_at: datetime
+    # Bumped by the repository on every update, used for ETag / Last-Modified
+    updated_at: Optional[datetime] = None
+    version: int = 1
+
+    def __post_init__(self):
+        if self.updated_at is None:
+            self.updated_at = self.created_at
+
+
+# Fields callers may change with update(); id, timestamps and version are kept by the repository
+UPDATABLE_FIELDS = ("title", "description", "completed")
+
+
+def todo_key(todo: TodoRecord) -> TodoKey:
+    return todo.created_at, todo.id
+
+
+@dataclass(slots=True)
+class TodoChange:
+    """One entry of the change feed: a todo was created, updated or deleted.
+
+    `seq` increases by one per change, `todo` is the todo after the change (None for deletes).
+    """
+
+    seq: int
+    op: str
+    id: TodoId
+    todo: Optional[TodoRecord]
+    changed_at: datetime
+
+
+# Number of changes kept for clients catching up on the change feed
+CHANGE_LOG_SIZE = 10_000
+
+
+# Lowercase a character and drop a single accent from a Latin letter, as unicode61 does
+def _fold(char: str) -> str:
+    char = char.lower()
+    decomposed = unicodedata.normalize("NFD", char)
+    if len(decomposed) == 2 and decomposed[0] < "\u02b0" and unicodedata.combining(decomposed[1]):
+        return decomposed[0]
+    return char
+
+
+# Split text into the word tokens used by full-text search, the same ones the SQLite backend indexes
+def tokenize(text: Optional[str]) -> Set[str]:
+    if not text:
+        return set()
+    return set(TOKEN_PATTERN.findall("".join(map(_fold, unicodedata.normalize("NFC", text)))))
+
+
+@dataclass
+class TodoFilter:
+    """Conditions a todo must match to be listed, unset fields match everything.
+
+    `text` matches todos whose title or description contain every word of it.
+    Both created_at bounds are exclusive.
+    """
+
+    completed: Optional[bool] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    text: Optional[str] = None
+
+
+class TodoRepository(ABC):
+    """Storage interface used by the todo route handlers.
+
+    Todos are `TodoRecord`s with the same fields as the `Todo` model.
+    """
+
+    # Names one lifetime of the stored collection: versions only compare within the same epoch.
+    # Empty for stores whose version survives restarts and is shared between workers.
+    epoch: str = ""
+
+    # Add a new todo record
+    @abstractmethod
+    def add(self, todo: TodoRecord) -> TodoRecord: ...
+
+    # Look up a todo by id, returns None when it does not exist
+    @abstractmethod
+    def get(self, todo_id: TodoId) -> Optional[TodoRecord]: ...
+
+    # Update the given fields of a todo, returns None when it does not exist
+    @abstractmethod
+    def update(self, todo_id: TodoId, **fields) -> Optional[TodoRecord]: ...
+
+    # Remove a todo by id, returns the removed record or None when it does not exist
+    @abstractmethod
+    def delete(self, todo_id: TodoId) -> Optional[TodoRecord]: ...
+
+    # Batch versions of add/update/delete, each batch is applied atomically.
+    # update_many and delete_many return None for ids that do not exist.
+    @abstractmethod
+    def add_many(self, todos: Iterable[TodoRecord]) -> List[TodoRecord]: ...
+
+    @abstractmethod
+    def update_many(self, updates: Iterable[Tuple[TodoId, dict]]) -> List[Optional[TodoRecord]]: ...
+
+    @abstractmethod
+    def delete_many(self, todo_ids: Iterable[TodoId]) -> List[Optional[TodoRecord]]: ...
+
+    # Up to `limit` todos matching `filters`, ordered by (created_at, id), starting after the `after` key
+    @abstractmethod
+    def page(
+        self,
+        after: Optional[TodoKey] = None,
+        limit: Optional[int] = None,
+        filters: Optional[TodoFilter] = None,
+    ) -> List[TodoRecord]: ...
+
+    # (version, last modified time) of the whole collection, the version changes on every write
+    @abstractmethod
+    def collection_version(self) -> Tuple[int, datetime]: ...
+
+    # Up to `limit` changes with seq greater than `since`, oldest first.
+    # Returns None when changes after `since` were already dropped from the log.
+    @abstractmethod
+    def changes_since(self, since: int, limit: int = 100) -> Optional[List[TodoChange]]: ...
+
+    # seq of the most recent change, 0 when nothing has changed yet
+    @abstractmethod
+    def last_change_seq(self) -> int: ...
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+    # Called once at startup, before requests arrive, to open connections and fill caches
+    def warm_up(self):
+        pass
+
+    # Called once at shutdown to release connections and flush anything pending
+    def close(self):
+        pass
+
+    # All todos in creation order
+    def all(self) -> List[TodoRecord]:
+        return self.page()
+
+    # Lazily walk todos in (created_at, id) order, one page at a time
+    def iter_pages(
+        self,
+        after: Optional[TodoKey] = None,
+        limit: Optional[int] = None,
+        filters: Optional[TodoFilter] = None,
+        page_size: int = 500,
+    ) -> Iterator[TodoRecord]:
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            page = self.page(after=after, limit=size, filters=filters)
+            if not page:
+                return
+            yield from page
+            after = todo_key(page[-1])
+            if remaining is not None:
+                remaining -= len(page)
+
+
+# Build the repository selected by the TODO_BACKEND environment variable ("memory", "durable" or "sqlite")
+def create_repository(backend: Optional[str] = None) -> TodoRepository:
+    backend = backend or os.getenv("TODO_BACKEND", "memory")
+    if backend == "memory":
+        from store import TodoStore
+
+        return TodoStore()
+    if backend == "durable":
+        from durable_store import DurableTodoStore
+
+        return DurableTodoStore(
+            os.getenv("TODO_DATA_DIR", "todo_data"),
+            snapshot_interval=float(os.getenv("TODO_SNAPSHOT_INTERVAL", "60")),
+            wait_for_sync=os.getenv("TODO_SYNC_WRITES", "1") != "0",
+        )
+    if backend == "sqlite":
+        from sqlite_store import SQLiteTodoRepository
+
+        return SQLiteTodoRepository(
+            os.getenv("TODO_DB_PATH", "todos.db"),
+            pool_size=int(os.getenv("TODO_DB_POOL_SIZE", "4")),
+        )
+    raise ValueError(f"Unknown todo backend: {backend!r}")
@@ -0,0 +1,42 @@
+import json
+from dataclasses import fields, is_dataclass
+from datetime import datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from todo_ids import format_todo_id
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the standard library encoder is the fallback
+    orjson = None
+
+
+# Todo ids are the only bytes in todo data, they are sent as UUID text
+def _default(value: Any):
+    if isinstance(value, bytes):
+        return format_todo_id(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if is_dataclass(value):
+        return {field.name: getattr(value, field.name) for field in fields(value)}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# Encode todo records and changes (and lists/dicts holding them) straight to JSON bytes
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+
+class TodoJSONResponse(JSONResponse):
+    """JSON response for data that is already valid, so it skips response_model validation.
+
+    Input is validated once by the request models and stored as `TodoRecord`s,
+    which are encoded directly instead of being rebuilt as `Todo` models.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
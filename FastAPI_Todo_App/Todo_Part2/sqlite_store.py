@@ -0,0 +1,460 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from repository import (
+    CHANGE_LOG_SIZE,
+    UPDATABLE_FIELDS,
+    TodoChange,
+    TodoFilter,
+    TodoKey,
+    TodoRecord,
+    TodoRepository,
+    tokenize,
+)
+from todo_ids import TodoId, parse_todo_id
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS todos (
+    id BLOB PRIMARY KEY,  -- 16-byte time-ordered id, see todo_ids.py
+    title TEXT NOT NULL,
+    description TEXT,
+    completed INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_todos_created_at ON todos (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_todos_completed ON todos (completed, created_at, id);
+
+-- Full-text index over title/description, kept in sync with the todos table by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS todos_fts USING fts5(
+    title, description, content='todos', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS todos_fts_insert AFTER INSERT ON todos BEGIN
+    INSERT INTO todos_fts (rowid, title, description) VALUES (new.rowid, new.title, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS todos_fts_delete AFTER DELETE ON todos BEGIN
+    INSERT INTO todos_fts (todos_fts, rowid, title, description)
+    VALUES ('delete', old.rowid, old.title, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS todos_fts_update AFTER UPDATE OF title, description ON todos BEGIN
+    INSERT INTO todos_fts (todos_fts, rowid, title, description)
+    VALUES ('delete', old.rowid, old.title, old.description);
+    INSERT INTO todos_fts (rowid, title, description) VALUES (new.rowid, new.title, new.description);
+END;
+
+-- Single-row table holding the collection version shared by every worker, bumped by triggers
+CREATE TABLE IF NOT EXISTS todo_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    last_modified TEXT NOT NULL
+);
+INSERT OR IGNORE INTO todo_meta (id, version, last_modified)
+VALUES (1, 0, strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+CREATE TRIGGER IF NOT EXISTS todos_meta_insert AFTER INSERT ON todos BEGIN
+    UPDATE todo_meta SET version = version + 1,
+        last_modified = strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime') WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS todos_meta_update AFTER UPDATE ON todos BEGIN
+    UPDATE todo_meta SET version = version + 1,
+        last_modified = strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime') WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS todos_meta_delete AFTER DELETE ON todos BEGIN
+    UPDATE todo_meta SET version = version + 1,
+        last_modified = strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime') WHERE id = 1;
+END;
+"""
+
+# Change feed: triggers append a copy of every written row, older entries are trimmed
+CHANGES_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS todo_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    todo_id BLOB NOT NULL,
+    title TEXT,
+    description TEXT,
+    completed INTEGER,
+    created_at TEXT,
+    updated_at TEXT,
+    version INTEGER,
+    changed_at TEXT NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS todos_changes_insert AFTER INSERT ON todos BEGIN
+    INSERT INTO todo_changes
+        (op, todo_id, title, description, completed, created_at, updated_at, version, changed_at)
+    VALUES ('created', new.id, new.title, new.description, new.completed, new.created_at,
+        new.updated_at, new.version, strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+END;
+CREATE TRIGGER IF NOT EXISTS todos_changes_update AFTER UPDATE ON todos BEGIN
+    INSERT INTO todo_changes
+        (op, todo_id, title, description, completed, created_at, updated_at, version, changed_at)
+    VALUES ('updated', new.id, new.title, new.description, new.completed, new.created_at,
+        new.updated_at, new.version, strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+END;
+CREATE TRIGGER IF NOT EXISTS todos_changes_delete AFTER DELETE ON todos BEGIN
+    INSERT INTO todo_changes (op, todo_id, changed_at)
+    VALUES ('deleted', old.id, strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+END;
+CREATE TRIGGER IF NOT EXISTS todo_changes_trim AFTER INSERT ON todo_changes BEGIN
+    DELETE FROM todo_changes WHERE seq <= new.seq - {CHANGE_LOG_SIZE};
+END;
+"""
+
+# Columns added after the first release of the schema, with their definitions
+ADDED_COLUMNS = {
+    "updated_at": "TEXT",
+    "version": "INTEGER NOT NULL DEFAULT 1",
+}
+
+# SQL statements are kept as constants so sqlite3's per-connection statement cache reuses them
+INSERT_TODO = (
+    "INSERT INTO todos (id, title, description, completed, created_at, updated_at, version) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+SELECT_COLUMNS = (
+    "SELECT id, title, description, completed, created_at, updated_at, version FROM todos"
+)
+SELECT_TODO = f"{SELECT_COLUMNS} WHERE id = ?"
+DELETE_TODO = "DELETE FROM todos WHERE id = ?"
+COUNT_TODOS = "SELECT COUNT(*) FROM todos"
+SELECT_COLLECTION_VERSION = "SELECT version, last_modified FROM todo_meta WHERE id = 1"
+SELECT_CHANGES = (
+    "SELECT seq, op, todo_id, title, description, completed, created_at, updated_at, version, "
+    "changed_at FROM todo_changes WHERE seq > ? ORDER BY seq LIMIT ?"
+)
+SELECT_LAST_CHANGE_SEQ = "SELECT COALESCE(MAX(seq), 0) FROM todo_changes"
+HAS_FTS_TABLE = "SELECT 1 FROM sqlite_master WHERE name = 'todos_fts'"
+HAS_CHANGES_TABLE = "SELECT 1 FROM sqlite_master WHERE name = 'todo_changes'"
+HAS_TEXT_IDS = "SELECT 1 FROM todos WHERE typeof(id) = 'text' LIMIT 1"
+REBUILD_FTS = "INSERT INTO todos_fts (todos_fts) VALUES ('rebuild')"
+
+
+# created_at is stored as fixed-width ISO text so that string order matches time order
+def format_timestamp(value: datetime) -> str:
+    return value.isoformat(timespec="microseconds")
+
+
+def todo_to_row(todo: TodoRecord) -> tuple:
+    return (
+        todo.id,
+        todo.title,
+        todo.description,
+        int(todo.completed),
+        format_timestamp(todo.created_at),
+        format_timestamp(todo.updated_at),
+        todo.version,
+    )
+
+
+# Quote every token so user input can't use FTS5 query syntax; separate tokens are ANDed
+def fts_query(text: str) -> str:
+    return " ".join(f'"{token}"' for token in sorted(tokenize(text)))
+
+
+def row_to_todo(row) -> TodoRecord:
+    return TodoRecord(
+        id=row[0],
+        title=row[1],
+        description=row[2],
+        completed=bool(row[3]),
+        created_at=datetime.fromisoformat(row[4]),
+        # Rows from before versioning have no updated_at, the record falls back to created_at
+        updated_at=datetime.fromisoformat(row[5]) if row[5] else None,
+        version=row[6],
+    )
+
+
+def row_to_change(row) -> TodoChange:
+    seq, op, todo_id, *todo_columns, changed_at = row
+    todo = row_to_todo((todo_id, *todo_columns)) if op != "deleted" else None
+    return TodoChange(seq, op, todo_id, todo, datetime.fromisoformat(changed_at))
+
+
+class ConnectionPool:
+    """A small pool of SQLite connections owned by one worker process.
+
+    Connections are opened lazily up to `size` and handed out LIFO so the
+    warmest connection (and its statement cache) is reused first.
+    """
+
+    def __init__(self, path: str, size: int = 4):
+        self.path = path
+        self.size = size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._opened = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,  # autocommit, transactions are opened explicitly
+            cached_statements=128,
+        )
+        # WAL lets readers keep going while another worker is writing
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        # Connections must not be shared with a forked child, start a fresh pool instead
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except BaseException:
+                    # Give the slot back, or a failed connect would shrink the pool for good
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    # Open every connection up front and run `prepare` on each, so no request pays for it
+    def warm_up(self, prepare=None):
+        connections = []
+        try:
+            for _ in range(self.size):
+                with self._lock:
+                    if self._opened < self.size:
+                        connections.append(self._connect())
+                        self._opened += 1
+                        continue
+                try:
+                    connections.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            if prepare is not None:
+                for conn in connections:
+                    prepare(conn)
+        finally:
+            for conn in connections:
+                self._idle.put(conn)
+
+    # Close the idle connections; connections in use are closed by their pool's owner process exiting
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._opened -= 1
+            conn.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self.connection() as conn:
+            # Take the write lock up front so the transaction never has to upgrade
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+
+class SQLiteTodoRepository(TodoRepository):
+    """Todo storage in an SQLite database file shared by all uvicorn workers."""
+
+    def __init__(self, path: str = "todos.db", pool_size: int = 4):
+        self.pool = ConnectionPool(path, size=pool_size)
+        with self.pool.connection() as conn:
+            has_fts = conn.execute(HAS_FTS_TABLE).fetchone()
+            self._add_missing_columns(conn)
+            self._convert_text_ids(conn)
+            conn.executescript(SCHEMA)
+            conn.executescript(CHANGES_SCHEMA)
+            # Index rows written before the full-text table existed
+            if not has_fts:
+                conn.execute(REBUILD_FTS)
+
+    def warm_up(self):
+        self.pool.warm_up(self._prepare)
+
+    def close(self):
+        # Fold the WAL back into the database file so the next start does not replay it
+        with self.pool.connection() as conn:
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        self.pool.close()
+
+    # Run the hot statements once so they sit in the connection's statement cache,
+    # and read the first page so its database pages are in the OS cache
+    @staticmethod
+    def _prepare(conn: sqlite3.Connection):
+        conn.execute(COUNT_TODOS).fetchone()
+        conn.execute(SELECT_COLLECTION_VERSION).fetchone()
+        conn.execute(SELECT_LAST_CHANGE_SEQ).fetchone()
+        conn.execute(SELECT_TODO, ("",)).fetchone()
+        conn.execute(f"{SELECT_COLUMNS} ORDER BY created_at, id LIMIT ?", (100,)).fetchall()
+
+    @staticmethod
+    def _add_missing_columns(conn: sqlite3.Connection):
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(todos)")}
+        # A brand new database gets every column from SCHEMA
+        if not existing:
+            return
+        for column, definition in ADDED_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE todos ADD COLUMN {column} {definition}")
+
+    # Databases from before time-ordered ids store uuid4 text, rewrite those ids as 16-byte blobs
+    @staticmethod
+    def _convert_text_ids(conn: sqlite3.Connection):
+        if not conn.execute("PRAGMA table_info(todos)").fetchone():
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another worker may have converted them while this one waited for the lock
+            if conn.execute(HAS_TEXT_IDS).fetchone():
+                conn.create_function("todo_id_blob", 1, lambda text: parse_todo_id(text) or text)
+                # Changing ids is not a change to the todos, so the change feed triggers must not see it;
+                # SCHEMA and CHANGES_SCHEMA recreate them right after
+                conn.execute("DROP TRIGGER IF EXISTS todos_meta_update")
+                conn.execute("DROP TRIGGER IF EXISTS todos_changes_update")
+                conn.execute("UPDATE todos SET id = todo_id_blob(id) WHERE typeof(id) = 'text'")
+                if conn.execute(HAS_CHANGES_TABLE).fetchone():
+                    conn.execute(
+                        "UPDATE todo_changes SET todo_id = todo_id_blob(todo_id) WHERE typeof(todo_id) = 'text'"
+                    )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def add(self, todo: TodoRecord) -> TodoRecord:
+        with self.pool.connection() as conn:
+            conn.execute(INSERT_TODO, todo_to_row(todo))
+        return todo
+
+    def get(self, todo_id: TodoId) -> Optional[TodoRecord]:
+        with self.pool.connection() as conn:
+            row = conn.execute(SELECT_TODO, (todo_id,)).fetchone()
+        return row_to_todo(row) if row else None
+
+    def update(self, todo_id: TodoId, **fields) -> Optional[TodoRecord]:
+        return self.update_many([(todo_id, fields)])[0]
+
+    def delete(self, todo_id: TodoId) -> Optional[TodoRecord]:
+        return self.delete_many([todo_id])[0]
+
+    def add_many(self, todos: Iterable[TodoRecord]) -> List[TodoRecord]:
+        todos = list(todos)
+        with self.pool.transaction() as conn:
+            conn.executemany(INSERT_TODO, [todo_to_row(todo) for todo in todos])
+        return todos
+
+    def update_many(self, updates: Iterable[Tuple[TodoId, dict]]) -> List[Optional[TodoRecord]]:
+        results = []
+        updated_at = format_timestamp(datetime.now())
+        with self.pool.transaction() as conn:
+            for todo_id, fields in updates:
+                self._update(conn, todo_id, fields, updated_at)
+                row = conn.execute(SELECT_TODO, (todo_id,)).fetchone()
+                results.append(row_to_todo(row) if row else None)
+        return results
+
+    def delete_many(self, todo_ids: Iterable[TodoId]) -> List[Optional[TodoRecord]]:
+        results = []
+        with self.pool.transaction() as conn:
+            for todo_id in todo_ids:
+                row = conn.execute(SELECT_TODO, (todo_id,)).fetchone()
+                if row:
+                    conn.execute(DELETE_TODO, (todo_id,))
+                results.append(row_to_todo(row) if row else None)
+        return results
+
+    @staticmethod
+    def _update(conn: sqlite3.Connection, todo_id: TodoId, fields: dict, updated_at: str):
+        columns = sorted(fields)
+        unknown = set(columns) - set(UPDATABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"Cannot update columns: {', '.join(sorted(unknown))}")
+        if not columns:
+            return
+        values = [int(fields[c]) if c == "completed" else fields[c] for c in columns]
+        # Column order is sorted, so each combination of fields maps to one cached statement
+        assignments = ", ".join(f"{c} = ?" for c in columns)
+        conn.execute(
+            f"UPDATE todos SET {assignments}, updated_at = ?, version = version + 1 WHERE id = ?",
+            (*values, updated_at, todo_id),
+        )
+
+    def page(
+        self,
+        after: Optional[TodoKey] = None,
+        limit: Optional[int] = None,
+        filters: Optional[TodoFilter] = None,
+    ) -> List[TodoRecord]:
+        clauses, params = [], []
+        if after is not None:
+            clauses.append("(created_at, id) > (?, ?)")
+            params += [format_timestamp(after[0]), after[1]]
+        if filters is not None:
+            if filters.completed is not None:
+                clauses.append("completed = ?")
+                params.append(int(filters.completed))
+            if filters.created_after is not None:
+                clauses.append("created_at > ?")
+                params.append(format_timestamp(filters.created_after))
+            if filters.created_before is not None:
+                clauses.append("created_at < ?")
+                params.append(format_timestamp(filters.created_before))
+            if tokenize(filters.text):
+                clauses.append("rowid IN (SELECT rowid FROM todos_fts WHERE todos_fts MATCH ?)")
+                params.append(fts_query(filters.text))
+            elif filters.text:
+                # No words to look for, so nothing matches
+                clauses.append("0")
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"{SELECT_COLUMNS}{where} ORDER BY created_at, id LIMIT ?"
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, (*params, -1 if limit is None else limit)).fetchall()
+        return [row_to_todo(row) for row in rows]
+
+    def collection_version(self) -> Tuple[int, datetime]:
+        with self.pool.connection() as conn:
+            version, last_modified = conn.execute(SELECT_COLLECTION_VERSION).fetchone()
+        return version, datetime.fromisoformat(last_modified)
+
+    def changes_since(self, since: int, limit: int = 100) -> Optional[List[TodoChange]]:
+        with self.pool.connection() as conn:
+            rows = conn.execute(SELECT_CHANGES, (since, limit)).fetchall()
+        # seq numbers are consecutive, a gap after `since` means those changes were trimmed
+        if rows and rows[0][0] > since + 1:
+            return None
+        return [row_to_change(row) for row in rows]
+
+    def last_change_seq(self) -> int:
+        with self.pool.connection() as conn:
+            return conn.execute(SELECT_LAST_CHANGE_SEQ).fetchone()[0]
+
+    def __len__(self) -> int:
+        with self.pool.connection() as conn:
+            return conn.execute(COUNT_TODOS).fetchone()[0]
@@ -0,0 +1,256 @@
+import secrets
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from dataclasses import replace
+from datetime import datetime
+from itertools import islice
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from repository import (
+    CHANGE_LOG_SIZE,
+    UPDATABLE_FIELDS,
+    TodoChange,
+    TodoFilter,
+    TodoKey,
+    TodoRecord,
+    TodoRepository,
+    todo_key,
+    tokenize,
+)
+from todo_ids import TodoId
+
+created_at_of_key = itemgetter(0)
+
+
+class TodoStore(TodoRepository):
+    """In-memory todo storage with an id -> record hash index.
+
+    Python dicts keep insertion order, so a single dict gives us O(1)
+    lookup, update and delete while listing still returns todos in the
+    order they were created. A sorted list of (created_at, id) keys lets
+    pages start right after a cursor instead of scanning from the start.
+
+    Filters are answered from secondary indexes kept up to date on every
+    change: the sorted keys for created_at ranges, one id set per
+    `completed` value and an inverted index from word token to ids.
+
+    Every change is also appended to a bounded change log whose seq is the
+    collection version, so clients can catch up on what changed.
+
+    Sync route handlers run in a thread pool, so every change goes through
+    one lock; batch operations hold it for the whole batch. Records are never
+    changed once stored: an update stores a new record in place of the old
+    one, so readers outside the lock always see a whole version of a todo.
+    """
+
+    def __init__(self, todos: Optional[List[TodoRecord]] = None):
+        self._todos: Dict[TodoId, TodoRecord] = {}
+        self._keys: List[TodoKey] = []
+        self._by_completed: Dict[bool, Set[TodoId]] = {True: set(), False: set()}
+        self._by_token: Dict[str, Set[TodoId]] = {}
+        self._version = 0
+        # The version restarts with every new store, so cached versions of an older one must not match
+        self.epoch = secrets.token_hex(4)
+        self._last_modified = datetime.now()
+        self._changes: deque = deque(maxlen=CHANGE_LOG_SIZE)
+        self._lock = threading.RLock()
+        for todo in todos or []:
+            self.add(todo)
+
+    # Add a new todo record, keyed by its id
+    def add(self, todo: TodoRecord) -> TodoRecord:
+        with self._lock:
+            return self._add(todo)
+
+    # Look up a todo by id, returns None when it does not exist
+    def get(self, todo_id: TodoId) -> Optional[TodoRecord]:
+        return self._todos.get(todo_id)
+
+    # Update the given fields of a todo, returns the new record or None when it does not exist
+    def update(self, todo_id: TodoId, **fields) -> Optional[TodoRecord]:
+        with self._lock:
+            return self._update(todo_id, fields)
+
+    # Remove a todo by id, returns the removed record or None when it does not exist
+    def delete(self, todo_id: TodoId) -> Optional[TodoRecord]:
+        with self._lock:
+            return self._delete(todo_id)
+
+    def add_many(self, todos: Iterable[TodoRecord]) -> List[TodoRecord]:
+        with self._lock:
+            return [self._add(todo) for todo in todos]
+
+    def update_many(self, updates: Iterable[Tuple[TodoId, dict]]) -> List[Optional[TodoRecord]]:
+        with self._lock:
+            return [self._update(todo_id, fields) for todo_id, fields in updates]
+
+    def delete_many(self, todo_ids: Iterable[TodoId]) -> List[Optional[TodoRecord]]:
+        with self._lock:
+            return [self._delete(todo_id) for todo_id in todo_ids]
+
+    # All todos in creation order
+    def all(self) -> List[TodoRecord]:
+        with self._lock:
+            return list(self._todos.values())
+
+    def collection_version(self) -> Tuple[int, datetime]:
+        with self._lock:
+            return self._version, self._last_modified
+
+    def changes_since(self, since: int, limit: int = 100) -> Optional[List[TodoChange]]:
+        with self._lock:
+            if not self._changes:
+                # An empty log is only up to date for clients that already saw every version;
+                # after a restart of a durable store the older changes are gone
+                return [] if since >= self._version else None
+            # seq numbers in the log are consecutive, so the position of `since` is known
+            start = since - self._changes[0].seq + 1
+            if start < 0:
+                return None
+            return list(islice(self._changes, start, start + limit))
+
+    def last_change_seq(self) -> int:
+        return self._version
+
+    # Up to `limit` todos matching `filters`, ordered by (created_at, id), starting after the `after` key
+    def page(
+        self,
+        after: Optional[TodoKey] = None,
+        limit: Optional[int] = None,
+        filters: Optional[TodoFilter] = None,
+    ) -> List[TodoRecord]:
+        with self._lock:
+            start, stop = self._key_range(after, filters)
+            candidates = self._candidates(filters)
+            if candidates is None:
+                if limit is not None:
+                    stop = min(stop, start + limit)
+                keys = self._keys[start:stop]
+            elif len(candidates) < stop - start:
+                # Fewer matches than keys in range: sort the matches instead of walking the range
+                low, high = self._keys[start], self._keys[stop - 1]
+                matches = (todo_key(self._todos[todo_id]) for todo_id in candidates)
+                keys = sorted(key for key in matches if low <= key <= high)[:limit]
+            else:
+                keys = []
+                for index in range(start, stop):
+                    if self._keys[index][1] in candidates:
+                        keys.append(self._keys[index])
+                        if limit is not None and len(keys) == limit:
+                            break
+            return [self._todos[todo_id] for _, todo_id in keys]
+
+    # Slice of the sorted keys that lies after the cursor and inside the created_at bounds
+    def _key_range(self, after: Optional[TodoKey], filters: Optional[TodoFilter]) -> Tuple[int, int]:
+        start = bisect_right(self._keys, after) if after is not None else 0
+        stop = len(self._keys)
+        if filters and filters.created_after is not None:
+            start = max(start, bisect_right(self._keys, filters.created_after, key=created_at_of_key))
+        if filters and filters.created_before is not None:
+            stop = bisect_left(self._keys, filters.created_before, key=created_at_of_key)
+        return start, max(start, stop)
+
+    # Ids allowed by the completed and text filters, or None when neither is set
+    def _candidates(self, filters: Optional[TodoFilter]) -> Optional[Set[TodoId]]:
+        if filters is None:
+            return None
+        id_sets = []
+        if filters.completed is not None:
+            id_sets.append(self._by_completed[filters.completed])
+        tokens = tokenize(filters.text)
+        if filters.text and not tokens:
+            # No words to look for, so nothing matches
+            return set()
+        for token in tokens:
+            id_sets.append(self._by_token.get(token, set()))
+        if not id_sets:
+            return None
+        # Intersect starting from the smallest set so the work is bounded by it
+        id_sets.sort(key=len)
+        return id_sets[0].intersection(*id_sets[1:])
+
+    def _add(self, todo: TodoRecord) -> TodoRecord:
+        self._todos[todo.id] = todo
+        self._index(todo)
+        self._touch("created", todo)
+        return todo
+
+    # Add a stored record to the sorted keys and the secondary indexes
+    def _index(self, todo: TodoRecord):
+        key = todo_key(todo)
+        # New todos almost always sort last, so appending is the common case
+        if not self._keys or self._keys[-1] < key:
+            self._keys.append(key)
+        else:
+            insort(self._keys, key)
+        self._by_completed[bool(todo.completed)].add(todo.id)
+        self._index_text(todo)
+
+    def _update(self, todo_id: TodoId, fields: dict) -> Optional[TodoRecord]:
+        todo = self._todos.get(todo_id)
+        if todo is None:
+            return None
+        unknown = set(fields) - set(UPDATABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"Cannot update fields: {', '.join(sorted(unknown))}")
+        if not fields:
+            return todo
+        updated = replace(todo, **fields, version=todo.version + 1, updated_at=datetime.now())
+        # Assigning to the existing key keeps the todo's place in creation order
+        self._todos[todo_id] = updated
+        text_changed = "title" in fields or "description" in fields
+        if text_changed:
+            self._unindex_text(todo)
+            self._index_text(updated)
+        self._by_completed[bool(todo.completed)].discard(todo_id)
+        self._by_completed[bool(updated.completed)].add(todo_id)
+        self._touch("updated", updated, updated.updated_at)
+        return updated
+
+    def _delete(self, todo_id: TodoId) -> Optional[TodoRecord]:
+        todo = self._todos.pop(todo_id, None)
+        if todo is not None:
+            self._unindex(todo)
+            self._touch("deleted", todo)
+        return todo
+
+    # Take a record out of the sorted keys and the secondary indexes
+    def _unindex(self, todo: TodoRecord):
+        key = todo_key(todo)
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            del self._keys[index]
+        self._by_completed[bool(todo.completed)].discard(todo.id)
+        self._unindex_text(todo)
+
+    # Record a change to the collection in the change log
+    def _touch(self, op: str, todo: TodoRecord, changed_at: Optional[datetime] = None):
+        self._version += 1
+        self._last_modified = changed_at or datetime.now()
+        # Records are never changed once stored, so the log can share them
+        self._changes.append(
+            TodoChange(self._version, op, todo.id, todo if op != "deleted" else None, self._last_modified)
+        )
+
+    def _index_text(self, todo: TodoRecord):
+        for token in tokenize(todo.title) | tokenize(todo.description):
+            self._by_token.setdefault(token, set()).add(todo.id)
+
+    def _unindex_text(self, todo: TodoRecord):
+        for token in tokenize(todo.title) | tokenize(todo.description):
+            ids = self._by_token.get(token)
+            if ids is not None:
+                ids.discard(todo.id)
+                if not ids:
+                    del self._by_token[token]
+
+    def __contains__(self, todo_id: TodoId) -> bool:
+        return todo_id in self._todos
+
+    def __iter__(self) -> Iterator[TodoRecord]:
+        return iter(self.all())
+
+    def __len__(self) -> int:
+        return len(self._todos)
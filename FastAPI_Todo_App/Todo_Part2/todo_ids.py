@@ -0,0 +1,56 @@
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+# Todo ids are 16-byte UUIDv7 values: a 48-bit millisecond timestamp, a 12-bit
+# counter for ids made in the same millisecond, then random bits. Bytes compare
+# in creation order, so new ids sort after old ones and index inserts append.
+# Internally ids stay as 16 raw bytes; the API uses the usual 36-character UUID text.
+TodoId = bytes
+
+TODO_ID_SIZE = 16
+_COUNTER_LIMIT = 1 << 12
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+# A new id, ordered after every id this process made before it
+def new_todo_id(timestamp: Optional[datetime] = None) -> TodoId:
+    global _last_ms, _counter
+    ms = int((timestamp.timestamp() if timestamp is not None else time.time()) * 1000)
+    with _lock:
+        if ms > _last_ms:
+            _last_ms, _counter = ms, 0
+        else:
+            # Same millisecond (or the clock went back): keep counting from the last id
+            _counter += 1
+            if _counter == _COUNTER_LIMIT:
+                _last_ms, _counter = _last_ms + 1, 0
+        ms, counter = _last_ms, _counter
+    random_bits = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | random_bits
+    return value.to_bytes(TODO_ID_SIZE, "big")
+
+
+# 36-character UUID text for the API
+def format_todo_id(todo_id: TodoId) -> str:
+    h = todo_id.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+# Parse UUID text (with or without dashes) from the API, None when it is not a valid id
+def parse_todo_id(text: str) -> Optional[TodoId]:
+    if len(text) == 36 and text[8] == text[13] == text[18] == text[23] == "-":
+        text = text.replace("-", "")
+    if len(text) != 32:
+        return None
+    try:
+        todo_id = bytes.fromhex(text)
+    except ValueError:
+        return None
+    # fromhex skips whitespace, which would leave fewer than 16 bytes
+    return todo_id if len(todo_id) == TODO_ID_SIZE else None
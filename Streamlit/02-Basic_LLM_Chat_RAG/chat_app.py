@@ -1,21 +1,41 @@
 # -------------- Imports --------------
 import os
-import shutil
-import tempfile
+import sys
+from pathlib import Path
+import chromadb
 import streamlit as st
 from dotenv import load_dotenv
 from langchain.schema import HumanMessage, AIMessage, SystemMessage
 from langchain_ollama import ChatOllama, OllamaEmbeddings
 from langchain_openai import ChatOpenAI
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.vectorstores import Chroma
 from langchain.memory import ConversationBufferMemory
 from langchain.chains import ConversationalRetrievalChain
 
+# Shared ingestion helpers live in rag_perf/ at the repository root
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from rag_perf.embedding import EmbeddingExecutor  # noqa: E402
+from rag_perf.index_cache import COLLECTION_NAME, IndexCache  # noqa: E402
+from rag_perf.pdf_loading import ParallelPDFLoader  # noqa: E402
+from rag_perf.pipeline import IngestPipeline, chroma_upsert  # noqa: E402
+
 # Load environment variables
 load_dotenv()
 
+# Embedding and chunking settings; indexes built with other settings are kept apart
+EMBEDDING_MODEL = "mxbai-embed-large"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+INDEX_NAMESPACE = f"{EMBEDDING_MODEL}/{CHUNK_SIZE}/{CHUNK_OVERLAP}"
+# Embedding requests kept in flight; only helps up to the server's OLLAMA_NUM_PARALLEL
+EMBEDDING_REQUESTS = 4
+# Directory holding one vector collection per uploaded PDF, keyed by the PDF's content
+INDEX_CACHE_DIRECTORY = "pdf_index"
+# Indexes kept on disk, the least recently used ones beyond this are deleted, as are those unused for a month
+INDEX_CACHE_SIZE = 20
+INDEX_CACHE_MAX_AGE = 30 * 24 * 3600
+
 
 # ----------------------- App Configuration -----------------------
 def configure_page():
@@ -46,6 +66,12 @@ def initialize_session_state():
     # Initialize vector store persistence directory
     if "persist_directory" not in st.session_state:
         st.session_state.persist_directory = None
+    # Initialize content keys of the uploaded files, so each file is hashed once
+    if "pdf_keys" not in st.session_state:
+        st.session_state.pdf_keys = {}
+    # Initialize the background job still indexing the current PDF
+    if "ingest_job" not in st.session_state:
+        st.session_state.ingest_job = None
     # Initialize default model
     if "model" not in st.session_state:
         st.session_state.model = "gpt-3.5-turbo"
@@ -66,70 +92,81 @@ def get_chat_model(model_name):
 
 @st.cache_resource  
 def get_embeddings():
-    """Get the embeddings model for processing the PDF."""
-    return OllamaEmbeddings(model="mxbai-embed-large")
+    """Get the embeddings model for processing the PDF, batching chunks over several concurrent requests."""
+    return EmbeddingExecutor(OllamaEmbeddings(model=EMBEDDING_MODEL), max_in_flight=EMBEDDING_REQUESTS)
+
+
+@st.cache_resource
+def get_index_cache():
+    """Get the on-disk cache of PDF vector stores shared by all sessions."""
+    return IndexCache(INDEX_CACHE_DIRECTORY, max_entries=INDEX_CACHE_SIZE, max_age=INDEX_CACHE_MAX_AGE)
 
 
 # ----------------------- PDF Processing -----------------------
-def process_pdf(pdf_file):
-    """Process the uploaded PDF file and create a vector store."""
-    # Save the uploaded PDF to a temporary file
-    tmp_file_path = save_temp_pdf(pdf_file)
-    # Load documents from the temporary PDF file
-    documents = load_pdf(tmp_file_path)
-    # Split the loaded documents into chunks
-    chunks = split_pdf(documents)
-    # Create a directory for persisting the vector store
-    persist_directory = create_chroma_persist_directory()
-    # Create a vector store from the document chunks
-    vectorstore = create_vectorstore(chunks, persist_directory)
-    # Remove the temporary PDF file after processing
-    os.unlink(tmp_file_path)
+def get_pdf_key(pdf_file):
+    """Get the content key of the uploaded PDF, hashing its bytes only once per upload."""
+    file_id = getattr(pdf_file, "file_id", pdf_file.name)
+    if file_id not in st.session_state.pdf_keys:
+        st.session_state.pdf_keys[file_id] = IndexCache.key(pdf_file.getvalue(), INDEX_NAMESPACE)
+    return st.session_state.pdf_keys[file_id]
+
+
+def process_pdf(pdf_file, pdf_key):
+    """Get the vector store of the uploaded PDF, only embedding it when no session has before."""
+    index_cache = get_index_cache()
+    vectorstore, job = index_cache.get_or_start(
+        pdf_key,
+        get_embeddings(),
+        lambda persist_directory: start_ingestion(pdf_file, persist_directory),
+        info={"file_name": pdf_file.name, "namespace": INDEX_NAMESPACE},
+    )
+    if job is not None:
+        # The first pages can be queried as soon as their chunks are stored, the rest follow in the background
+        job.wait_first_batch()
+    st.session_state.ingest_job = job
+    # Store the directory name in session state
+    st.session_state.persist_directory = index_cache.path(pdf_key)
     return vectorstore
 
 
-def save_temp_pdf(pdf_file):
-    """Save the uploaded PDF file to a temporary file and return the file path."""
-    # Create a temporary file to store the PDF
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-        tmp_file.write(pdf_file.getvalue())
-        return tmp_file.name
+def start_ingestion(pdf_file, persist_directory):
+    """Start streaming the PDF through splitting, embedding and storage, returning the vector store and the job."""
+    vectorstore, collection = create_vectorstore(persist_directory)
+    pipeline = IngestPipeline(
+        get_text_splitter(),
+        get_embeddings().submit,
+        chroma_upsert(collection),
+    )
+    # Load pages straight from the uploaded file, no temporary copy on disk
+    return vectorstore, pipeline.start(load_pdf(pdf_file))
 
 
-def load_pdf(tmp_file_path):
-    """Load the PDF file using PyPDFLoader and return the documents."""
-    loader = PyPDFLoader(tmp_file_path)
-    return loader.load()
+def load_pdf(pdf_file):
+    """Load the uploaded PDF from memory, extracting pages on all cores and yielding them in page order."""
+    loader = ParallelPDFLoader(pdf_file, source=pdf_file.name)
+    return loader.lazy_load()
 
 
-def split_pdf(documents):
-    """Split the PDF documents into chunks for processing."""
+def get_text_splitter():
+    """Get the splitter that cuts PDF pages into chunks for processing."""
     # Create a RecursiveCharacterTextSplitter instance for splitting text
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,  
-        chunk_overlap=200, 
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
         length_function=len,
     )
-    return text_splitter.split_documents(documents)
-
-
-def create_chroma_persist_directory():
-    """Create a directory for persisting the Chroma vector store."""
-    persist_directory = "db"
-    # Store the directory name in session state
-    st.session_state.persist_directory = persist_directory
-    return persist_directory
 
 
-def create_vectorstore(chunks, persist_directory):
-    """Create a Chroma vector store from the document chunks."""
+def create_vectorstore(persist_directory):
+    """Create an empty Chroma vector store, and the collection behind it that the ingestion pipeline fills."""
     embeddings = get_embeddings()
-    # Create a Chroma vector store from the documents and embeddings
-    return Chroma.from_documents(
-        documents=chunks, 
-        embedding=embeddings,
-        persist_directory=persist_directory,  
+    client = chromadb.PersistentClient(path=persist_directory)
+    vectorstore = Chroma(
+        client=client,
+        collection_name=COLLECTION_NAME,
+        embedding_function=embeddings,
     )
+    return vectorstore, client.get_or_create_collection(COLLECTION_NAME)
 
 
 # ----------------------- Chat Interface -----------------------
@@ -215,51 +252,66 @@ def clear_chat():
     """Clear the chat history and reset the conversation state."""
     st.session_state.messages = []
     st.session_state.conversation = None
-    cleanup_chroma_db()
+    # The PDF's vector store stays cached, so the next run re-attaches it without re-embedding
+    st.session_state.pdf_processed = None
     st.rerun()
 
 
 def clear_cache():
     """Clear the Streamlit cache to reset the application state."""
+    # Stop the cached embedding executor's threads and pending embeddings, the cache would just drop it
+    get_embeddings().shutdown(wait=False)
     st.cache_data.clear()
     st.cache_resource.clear()
 
 
-def cleanup_chroma_db():
-    """Clean up the Chroma database directory if it exists."""
-
-    persist_directory = st.session_state.get("persist_directory")
-
-    # Check if the directory exists and attempt to remove it
-    if persist_directory and os.path.exists(persist_directory):
-        try:
-            shutil.rmtree(persist_directory)
-            st.session_state.persist_directory = None
-        except Exception as e:
-            st.error(f"Error cleaning up Chroma DB: {e}")
+# ----------------------- PDF Upload Handler -----------------------
+def show_ingest_progress(job):
+    """Show the progress of the background job indexing the PDF, if it is still running."""
+    if job is None:
+        return
+    if job.error is not None:
+        st.error(f"Error indexing PDF: {job.error}")
+        # The failed index was deleted, so forget this PDF and build it again on the next interaction
+        for file_id, pdf_key in list(st.session_state.pdf_keys.items()):
+            if pdf_key == st.session_state.pdf_processed:
+                del st.session_state.pdf_keys[file_id]
+        st.session_state.pdf_processed = None
+        st.session_state.ingest_job = None
+    elif not job.done:
+        progress = job.progress
+        st.info(
+            f"Indexing in the background: {progress.pages} pages read, "
+            f"{progress.stored} of {progress.chunks} chunks searchable so far."
+        )
 
 
-# ----------------------- PDF Upload Handler -----------------------
 def handle_pdf_upload(pdf_file, chat_model):
     """Handle the PDF upload and process the PDF to initialize the chat conversation."""
-    # Check if the PDF has already been processed
-    if st.session_state.pdf_processed != pdf_file.name:
+    # Check if this PDF's content has already been processed, whatever the file is called
+    pdf_key = get_pdf_key(pdf_file)
+    # Build the index again if the cache evicted it while this session was using it
+    job = st.session_state.ingest_job
+    if (job is None or job.done) and pdf_key not in get_index_cache():
+        st.session_state.pdf_processed = None
+    if st.session_state.pdf_processed != pdf_key:
         # Display a processing message while the PDF is being processed
         with st.spinner("Processing PDF..."):
-            # Clean up the previous Chroma database if it exists
-            cleanup_chroma_db()
-            # Process the uploaded PDF to create a vector store
-            vectorstore = process_pdf(pdf_file)
+            # Attach the cached vector store, or process the uploaded PDF to create one
+            vectorstore = process_pdf(pdf_file, pdf_key)
             # Initialize a new conversation with the vector store and chat model
             st.session_state.conversation = initialize_conversation(
                 vectorstore, chat_model
             )
             # Mark the PDF as processed in the session state
-            st.session_state.pdf_processed = pdf_file.name
+            st.session_state.pdf_processed = pdf_key
             # Reset the messages in the session state
             st.session_state.messages = []
             st.success("PDF processed successfully!")
 
+    # Show how far background indexing got, answers only use the pages stored so far
+    show_ingest_progress(st.session_state.ingest_job)
+
     # Display chat messages if available
     display_chat_messages()
 
@@ -7,10 +7,16 @@ from langchain.schema import HumanMessage, AIMessage, SystemMessage
 from langchain_ollama import ChatOllama, OllamaEmbeddings
 from langchain.vectorstores import Chroma
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.document_loaders import PyPDFLoader
 from langchain.chains import RetrievalQA
 import os
+import sys
 import tempfile
+from pathlib import Path
+
+# Shared ingestion helpers live in rag_perf/ at the repository root
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from rag_perf.embedding import EmbeddingExecutor  # noqa: E402
+from rag_perf.pdf_loading import ParallelPDFLoader  # noqa: E402
 
 # Load environment variables from a .env file
 load_dotenv()
@@ -65,6 +71,8 @@ def handle_sidebar():
         st.rerun()
     
     if st.sidebar.button("Clear Cache"):
+        # Stop the cached embedding executor's threads and pending embeddings, the cache would just drop it
+        get_embeddings().shutdown(wait=False)
         st.cache_data.clear()
         st.cache_resource.clear()
     
@@ -84,20 +92,18 @@ def get_chat_model(model_name):
         )
     return ChatOllama(model=model_name, streaming=True)
 
+# Embed chunks in batches with several requests in flight; match OLLAMA_NUM_PARALLEL on the server
 @st.cache_resource
 def get_embeddings():
-    return OllamaEmbeddings(
-        model="mxbai-embed-large"
+    return EmbeddingExecutor(
+        OllamaEmbeddings(model="mxbai-embed-large"),
+        max_in_flight=4
     )
 
+# Read pages straight from the uploaded file on all cores, yielding documents in page order
 def load_pdf(uploaded_file):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-        tmp_file.write(uploaded_file.read())
-        tmp_file_path = tmp_file.name
-    loader = PyPDFLoader(tmp_file_path)
-    documents = loader.load()
-    os.unlink(tmp_file_path)  # Clean up the temporary file
-    return documents
+    loader = ParallelPDFLoader(uploaded_file, source=uploaded_file.name)
+    return loader.lazy_load()
 
 def split_text(documents):
     text_splitter = RecursiveCharacterTextSplitter(
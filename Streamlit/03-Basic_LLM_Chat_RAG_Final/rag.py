@@ -1,13 +1,19 @@
+import sys
+from pathlib import Path
+
 from langchain_community.vectorstores import Chroma
 from langchain_community.chat_models import ChatOllama
 from langchain_community.embeddings import FastEmbedEmbeddings
 from langchain.schema.output_parser import StrOutputParser
-from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema.runnable import RunnablePassthrough
 from langchain.prompts import PromptTemplate
 from langchain.vectorstores.utils import filter_complex_metadata
 
+# Shared ingestion helpers live in rag_perf/ at the repository root
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from rag_perf.pdf_loading import ParallelPDFLoader  # noqa: E402
+
 
 class ChatPDF:
     vector_store = None
@@ -32,7 +38,9 @@ class ChatPDF:
         )
 
     def ingest(self, pdf_file_path: str):
-        docs = PyPDFLoader(file_path=pdf_file_path).load()
+        # Pages are extracted on all cores and split as they arrive, in page order
+        with open(pdf_file_path, "rb") as pdf_file:
+            docs = ParallelPDFLoader(pdf_file.read(), source=pdf_file_path).lazy_load()
         chunks = self.text_splitter.split_documents(docs)
         chunks = filter_complex_metadata(chunks)
 
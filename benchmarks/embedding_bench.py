@@ -0,0 +1,169 @@
+"""Embedding throughput benchmark against a local stub embedding server.
+
+Starts a stub that speaks Ollama's /api/embed and behaves like a loaded
+embedding server: each request takes `--overhead` plus `--per-text` seconds
+per input on one of `--parallel` slots, and fails with 503 at `--fail-rate`.
+The same texts are then embedded through `OllamaEmbeddings` directly (one
+request for everything, as `Chroma.from_documents` does) and through
+`EmbeddingExecutor`. Results are printed as JSON.
+
+Usage:
+    python benchmarks/embedding_bench.py --texts 2000 --parallel 4
+    python benchmarks/embedding_bench.py --fail-rate 0.05 --max-in-flight 8
+    python benchmarks/embedding_bench.py --serve --port 11435   # only run the stub, e.g. for the chat apps
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(REPO_ROOT))
+
+
+# Deterministic unit-ish vector for a text, so results can be compared between runs
+def stub_vector(text: str, dimensions: int):
+    seed = hashlib.sha256(text.encode()).digest()
+    values = [value / 2**31 for value in struct.unpack("<8i", seed)]
+    return [values[i % len(values)] for i in range(dimensions)]
+
+
+class StubEmbeddingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, parallel: int, overhead: float, per_text: float, fail_rate: float, dimensions: int):
+        super().__init__(("127.0.0.1", port), StubEmbeddingHandler)
+        self.slots = threading.Semaphore(parallel)
+        self.overhead = overhead
+        self.per_text = per_text
+        self.fail_rate = fail_rate
+        self.dimensions = dimensions
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubEmbeddingHandler(BaseHTTPRequestHandler):
+    server: StubEmbeddingServer
+
+    def do_POST(self):
+        if self.path != "/api/embed":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        server = self.server
+        with server.slots:
+            server.requests += 1
+            time.sleep(server.overhead + server.per_text * len(texts))
+            if random.random() < server.fail_rate:
+                server.failures += 1
+                self._reply(503, {"error": "server overloaded"})
+                return
+        self._reply(200, {
+            "model": body.get("model"),
+            "embeddings": [stub_vector(text, server.dimensions) for text in texts],
+        })
+
+    def _reply(self, status: int, payload: dict):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(args) -> StubEmbeddingServer:
+    server = StubEmbeddingServer(
+        args.port, args.parallel, args.overhead, args.per_text, args.fail_rate, args.dimensions
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Embed `texts` with `embeddings`, returning the timing (and the error, if the call failed)
+def measure(name: str, embeddings, texts, server: StubEmbeddingServer) -> dict:
+    requests_before = server.requests
+    started = time.perf_counter()
+    error = None
+    try:
+        vectors = embeddings.embed_documents(texts)
+        correct = all(vector == stub_vector(text, server.dimensions) for text, vector in zip(texts, vectors))
+    except Exception as exc:
+        error, correct = repr(exc), False
+    elapsed = time.perf_counter() - started
+    return {
+        "name": name,
+        "texts": len(texts),
+        "duration_s": round(elapsed, 3),
+        "throughput_texts_per_s": round(len(texts) / elapsed, 1),
+        "server_requests": server.requests - requests_before,
+        "correct": correct,
+        "error": error,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=2000, help="texts to embed")
+    parser.add_argument("--port", type=int, default=0, help="stub server port (default: any free port)")
+    parser.add_argument("--parallel", type=int, default=4, help="requests the stub serves at once")
+    parser.add_argument("--overhead", type=float, default=0.05, help="stub seconds per request")
+    parser.add_argument("--per-text", type=float, default=0.002, help="stub seconds per text")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of stub requests failing with 503")
+    parser.add_argument("--dimensions", type=int, default=64)
+    parser.add_argument("--max-in-flight", type=int, default=4, help="EmbeddingExecutor requests in flight")
+    parser.add_argument("--serve", action="store_true", help="only run the stub server until interrupted")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    server = start_stub(args)
+    if args.serve:
+        print(f"Stub embedding server on {server.url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            return
+
+    from langchain_ollama import OllamaEmbeddings
+
+    from rag_perf.embedding import EmbeddingExecutor
+
+    texts = [f"Chunk {i}: " + "lorem ipsum " * random.randint(20, 80) for i in range(args.texts)]
+    embeddings = OllamaEmbeddings(model="stub", base_url=server.url)
+    executor = EmbeddingExecutor(embeddings, max_in_flight=args.max_in_flight)
+    results = [
+        measure("single_request", embeddings, texts, server),
+        measure("embedding_executor", executor, texts, server),
+    ]
+    results[1]["final_batch_size"] = executor.stats.batch_size
+    results[1]["retries"] = executor.stats.retries
+    executor.shutdown()
+    server.shutdown()
+
+    report = {"config": {key: value for key, value in vars(args).items() if key != "output"}, "results": results}
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
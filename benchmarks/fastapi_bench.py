@@ -0,0 +1,228 @@
+"""Throughput and latency benchmark for the FastAPI tutorial apps.
+
+Drives the apps in-process through httpx's ASGI transport, so the numbers
+measure the app (routing, validation, storage, serialization) rather than
+the network or the server. Results are printed as JSON.
+
+Usage:
+    python benchmarks/fastapi_bench.py --requests 2000 --concurrency 32 --dataset 10000
+    python benchmarks/fastapi_bench.py --scenario todo.get --scenario items.get --output results.json
+    python benchmarks/fastapi_bench.py --todo-backend sqlite
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+# Measure the apps themselves, not their per-client rate limits
+os.environ.setdefault("ADMISSION_CONTROL", "0")
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+TODO_APP = REPO_ROOT / "FastAPI_Todo_App" / "Todo_Part2" / "main.py"
+PART3_APP = REPO_ROOT / "FastAPI" / "FastAPI_Part3" / "main.py"
+
+
+# Import an app's main.py by path, making its sibling modules importable
+def load_app(path: Path, module_name: str):
+    app_dir = str(path.parent)
+    # Tutorial folders reuse module names, so drop any cached module that lives next to this app
+    for sibling in path.parent.glob("*.py"):
+        sys.modules.pop(sibling.stem, None)
+    sys.path.insert(0, app_dir)
+    try:
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(app_dir)
+    return module.app
+
+
+def to_ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+# Send `requests` requests built by `make_request(i)` from `concurrency` concurrent workers
+async def run_scenario(client, name, make_request, requests, concurrency):
+    counter = itertools.count()
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while (i := next(counter)) < requests:
+            method, url, body = make_request(i)
+            start = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "name": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "mean": to_ms(statistics.fmean(latencies)) if latencies else None,
+            "p50": to_ms(percentile(latencies, 0.50)),
+            "p95": to_ms(percentile(latencies, 0.95)),
+            "p99": to_ms(percentile(latencies, 0.99)),
+            "max": to_ms(latencies[-1] if latencies else None),
+        },
+    }
+
+
+# ----------------------- Todo_Part2 scenarios -----------------------
+async def seed_todos(client, count):
+    ids = []
+    for start in range(0, count, 1000):
+        batch = [
+            {"title": f"Seeded todo {i}", "description": f"Benchmark item number {i}"}
+            for i in range(start, min(start + 1000, count))
+        ]
+        response = await client.post("/todos/batch", json=batch)
+        response.raise_for_status()
+        ids.extend(item["id"] for item in response.json())
+    return ids
+
+
+async def todo_scenarios(args):
+    app = load_app(TODO_APP, "todo_part2_main")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        ids = await seed_todos(client, args.dataset)
+
+        # Spread reads and updates over the whole dataset instead of hitting the same todo
+        def pick(i):
+            return ids[(i * 7919) % len(ids)]
+
+        scenarios = {
+            "todo.create": lambda i: ("POST", "/todos/", {"title": f"Bench todo {i}"}),
+            "todo.get": lambda i: ("GET", f"/todos/{pick(i)}", None),
+            "todo.update": lambda i: (
+                "PUT", f"/todos/{pick(i)}", {"title": f"Updated {i}", "completed": i % 2 == 0},
+            ),
+            "todo.list_page": lambda i: ("GET", "/todos/?limit=50", None),
+            "todo.search": lambda i: ("GET", f"/todos/?q=number+{i % args.dataset}&limit=50", None),
+        }
+        return [
+            await run_scenario(client, name, make_request, args.requests, args.concurrency)
+            for name, make_request in scenarios.items()
+            if name in args.scenario
+        ]
+
+
+# ----------------------- FastAPI_Part3 scenarios -----------------------
+def user_payload(i):
+    return {
+        "id": i,
+        "username": f"bench_user_{i}",
+        "name": "Bench User",
+        "age": 30,
+        "email": f"bench_user_{i}@example.com",
+        "address": {
+            "street": "1 Main St",
+            "city": "Springfield",
+            "postal_code": "12345",
+            "state": "IL",
+            "country": "US",
+            "zip_code": "12345",
+        },
+    }
+
+
+async def part3_scenarios(args):
+    app = load_app(PART3_APP, "fastapi_part3_main")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        scenarios = {
+            "users.create": lambda i: ("POST", "/users/", user_payload(i)),
+            "items.get": lambda i: ("GET", f"/items/{i % 2 + 1}", None),
+        }
+        return [
+            await run_scenario(client, name, make_request, args.requests, args.concurrency)
+            for name, make_request in scenarios.items()
+            if name in args.scenario
+        ]
+
+
+ALL_SCENARIOS = [
+    "todo.create",
+    "todo.get",
+    "todo.update",
+    "todo.list_page",
+    "todo.search",
+    "users.create",
+    "items.get",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--dataset", type=int, default=10_000, help="todos created before the todo scenarios")
+    parser.add_argument(
+        "--scenario", action="append", choices=ALL_SCENARIOS, help="scenario to run (repeatable, default: all)"
+    )
+    parser.add_argument("--todo-backend", choices=["memory", "durable", "sqlite"], default="memory")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    args.scenario = args.scenario or ALL_SCENARIOS
+    return args
+
+
+async def main():
+    args = parse_args()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if any(name.startswith("todo.") for name in args.scenario):
+            os.environ["TODO_BACKEND"] = args.todo_backend
+            os.environ["TODO_DB_PATH"] = os.path.join(tmp_dir, "bench_todos.db")
+            os.environ["TODO_DATA_DIR"] = os.path.join(tmp_dir, "bench_todo_data")
+            results += await todo_scenarios(args)
+        if any(not name.startswith("todo.") for name in args.scenario):
+            results += await part3_scenarios(args)
+
+    report = {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "dataset": args.dataset,
+            "todo_backend": args.todo_backend,
+            "python": platform.python_version(),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
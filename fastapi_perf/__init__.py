@@ -0,0 +1 @@
+"""Performance helpers shared by the FastAPI tutorial apps."""
@@ -0,0 +1,216 @@
+"""Route-level response cache for read endpoints.
+
+`install_response_cache(app)` adds an ASGI middleware in front of the app
+and returns a `ResponseCache`. Endpoints opt in with its decorator:
+
+    response_cache = install_response_cache(app)
+
+    @app.get("/items/{item_id}")
+    @response_cache.cached(ttl=60, tags=("items", "item:{item_id}"))
+    async def read_item(item_id: int): ...
+
+The first GET of a path and query string runs the endpoint as usual and
+stores the JSON-encoded body. Until it expires or is invalidated, later
+requests for the same key are answered by the middleware straight from the
+stored bytes, before routing, parameter validation or encoding happen.
+Write endpoints call `response_cache.invalidate(tag)` to drop stale entries.
+
+Install it before the metrics and admission control middlewares, so that it
+sits inside them: cache hits are then still counted per route (hits carry
+the route of the request that filled the entry) and still rate-limited.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+# Cache key and ASGI scope of the GET request being handled, set by the middleware for the decorator
+_request_key: contextvars.ContextVar[Optional[Tuple[str, dict]]] = contextvars.ContextVar(
+    "response_cache_key", default=None
+)
+
+
+# Path plus query string with parameters sorted, so ?a=1&b=2 and ?b=2&a=1 share an entry
+def cache_key(path: str, query_string: bytes) -> str:
+    if not query_string:
+        return path
+    params = sorted(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True))
+    return f"{path}?{urlencode(params)}"
+
+
+# Encode an endpoint's return value the way FastAPI's default JSONResponse does
+def encode_json(content) -> bytes:
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class _Entry:
+    __slots__ = ("body", "expires_at", "tags", "route")
+
+    def __init__(self, body: bytes, expires_at: float, tags: Tuple[str, ...], route=None):
+        self.body = body
+        self.expires_at = expires_at
+        self.tags = tags
+        # Route that produced the body, put back in the scope of cache hits for metrics
+        self.route = route
+
+
+class ResponseCache:
+    """Bounded LRU of encoded JSON bodies with a per-entry TTL and tag-based invalidation."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_tag: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a response computed before one is not stored after it
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    # Stored body for `key`, or None when missing or expired
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._lookup(key)
+        return entry.body if entry is not None else None
+
+    def _lookup(self, key: str) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(
+        self,
+        key: str,
+        body: bytes,
+        ttl: float,
+        tags: Iterable[str] = (),
+        generation: Optional[int] = None,
+        route=None,
+    ):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            entry = _Entry(body, time.monotonic() + ttl, tuple(tags), route)
+            self._entries[key] = entry
+            for tag in entry.tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    # Drop every entry stored with any of the given tags
+    def invalidate(self, *tags: str):
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in list(self._by_tag.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    # Decorator for a GET endpoint whose JSON response can be reused for `ttl` seconds.
+    # Tags may use the endpoint's parameters, e.g. "item:{item_id}". The return value is
+    # encoded as is, so it should already have the shape of the route's response_model.
+    def cached(self, ttl: float = 60.0, tags: Iterable[str] = ()) -> Callable:
+        tags = tuple(tags)
+
+        def decorator(endpoint: Callable) -> Callable:
+            is_async = inspect.iscoroutinefunction(endpoint)
+
+            # Always async: FastAPI would run a sync wrapper in the thread pool, so run the endpoint there instead
+            @functools.wraps(endpoint)
+            async def wrapper(*args, **kwargs):
+                generation = self._generation
+                if is_async:
+                    result = await endpoint(*args, **kwargs)
+                else:
+                    result = await run_in_threadpool(endpoint, *args, **kwargs)
+                if isinstance(result, Response):
+                    return result
+                body = encode_json(result)
+                request = _request_key.get()
+                if request is not None:
+                    key, scope = request
+                    tags_for_call = [tag.format(**kwargs) for tag in tags]
+                    self.set(key, body, ttl, tags_for_call, generation, scope.get("route"))
+                return Response(content=body, media_type="application/json", headers={"X-Cache": "MISS"})
+
+            return wrapper
+
+        return decorator
+
+
+class ResponseCacheMiddleware:
+    """Answers GET requests from the cache before they reach the router."""
+
+    def __init__(self, app, cache: ResponseCache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        key = cache_key(scope["path"], scope["query_string"])
+        entry = self.cache._lookup(key)
+        if entry is None:
+            token = _request_key.set((key, scope))
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _request_key.reset(token)
+            return
+        body = entry.body
+        if entry.route is not None:
+            scope["route"] = entry.route
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-cache", b"HIT"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def install_response_cache(app: FastAPI, maxsize: int = 1024) -> ResponseCache:
+    cache = ResponseCache(maxsize)
+    app.add_middleware(ResponseCacheMiddleware, cache=cache)
+    return cache
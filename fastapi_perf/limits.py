@@ -0,0 +1,234 @@
+"""Rate limiting and admission control for FastAPI apps.
+
+`install_admission_control(app)` adds an ASGI middleware that checks every
+HTTP request before it reaches the router, so rejected requests cost almost
+nothing:
+
+* a global concurrency limit: past `max_concurrent` in-flight requests, new
+  ones wait in a bounded queue; when the queue is full, or a request waited
+  longer than `queue_timeout`, it is shed with 503 and Retry-After;
+* per-route limits, added with `AdmissionControl.limit(method, path, ...)`:
+  a token bucket per client (429 and Retry-After when empty) and,
+  optionally, a concurrency limit of the route's own.
+
+Long-lived endpoints (streams, long polls) should be listed in `exempt`,
+otherwise each open connection holds a concurrency slot.
+Setting ADMISSION_CONTROL=0 turns the middleware off.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, List, Optional, Pattern, Tuple
+
+from fastapi import FastAPI
+from starlette.routing import compile_path
+
+# Most clients whose token buckets are remembered per route, least recently seen are dropped first
+MAX_TRACKED_CLIENTS = 10_000
+
+
+class TokenBuckets:
+    """One token bucket per client: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    # Take a token for `client`; returns 0 when allowed, otherwise seconds until a token is available
+    def take(self, client: str) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = [float(self.burst), now]
+            if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / self.rate
+
+
+class ConcurrencyLimiter:
+    """At most `max_concurrent` holders; up to `max_queue` more wait in FIFO order.
+
+    Used from the event loop only, so it needs no locks.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    # True once a slot is held, False when the request should be shed
+    async def acquire(self) -> bool:
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands its slot straight to the waiter, so `active` is already counted
+            await asyncio.wait_for(waiter, self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        except asyncio.CancelledError:
+            # The request went away just after being handed a slot, pass the slot on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+
+@dataclass
+class RouteLimit:
+    method: str
+    path: str
+    regex: Pattern
+    buckets: Optional[TokenBuckets] = None
+    limiter: Optional[ConcurrencyLimiter] = None
+    rejected: int = field(default=0)
+
+
+class AdmissionControl:
+    """Global and per-route limits applied by `AdmissionMiddleware`."""
+
+    def __init__(
+        self,
+        max_concurrent: int = 256,
+        max_queue: int = 1024,
+        queue_timeout: float = 5.0,
+        exempt: Tuple[str, ...] = (),
+        trust_forwarded_for: bool = False,
+    ):
+        self.limiter = ConcurrencyLimiter(max_concurrent, max_queue, queue_timeout)
+        self.exempt = exempt
+        self.trust_forwarded_for = trust_forwarded_for
+        self.routes: List[RouteLimit] = []
+        self.shed = 0
+
+    # Limit one route, `path` being the route's path template such as "/todos/{todo_id}".
+    # `rate`/`burst` set a token bucket per client; `max_concurrent` caps the route's in-flight requests.
+    def limit(
+        self,
+        method: str,
+        path: str,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_concurrent: Optional[int] = None,
+        max_queue: int = 0,
+    ) -> RouteLimit:
+        regex, _, _ = compile_path(path)
+        route = RouteLimit(method.upper(), path, regex)
+        if rate is not None:
+            route.buckets = TokenBuckets(rate, burst if burst is not None else max(1, math.ceil(rate)))
+        if max_concurrent is not None:
+            route.limiter = ConcurrencyLimiter(max_concurrent, max_queue, self.limiter.queue_timeout)
+        self.routes.append(route)
+        return route
+
+    def match(self, method: str, path: str) -> Optional[RouteLimit]:
+        for route in self.routes:
+            if route.method == method and route.regex.match(path):
+                return route
+        return None
+
+    def client_id(self, scope) -> str:
+        if self.trust_forwarded_for:
+            for name, value in scope["headers"]:
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+
+async def _reject(send, status: int, retry_after: float, detail: str):
+    body = b'{"detail":"%s"}' % detail.encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware enforcing an `AdmissionControl`."""
+
+    def __init__(self, app, control: AdmissionControl):
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope, receive, send):
+        control = self.control
+        if scope["type"] != "http" or (control.exempt and scope["path"].startswith(control.exempt)):
+            await self.app(scope, receive, send)
+            return
+
+        route = control.match(scope["method"], scope["path"])
+        if route is not None and route.buckets is not None:
+            retry_after = route.buckets.take(control.client_id(scope))
+            if retry_after:
+                route.rejected += 1
+                await _reject(send, 429, retry_after, "Too many requests")
+                return
+
+        if not await control.limiter.acquire():
+            control.shed += 1
+            await _reject(send, 503, control.limiter.queue_timeout, "Server is busy, try again later")
+            return
+        try:
+            if route is not None and route.limiter is not None:
+                if not await route.limiter.acquire():
+                    route.rejected += 1
+                    await _reject(send, 503, route.limiter.queue_timeout, "Server is busy, try again later")
+                    return
+                try:
+                    await self.app(scope, receive, send)
+                finally:
+                    route.limiter.release()
+            else:
+                await self.app(scope, receive, send)
+        finally:
+            control.limiter.release()
+
+
+def install_admission_control(app: FastAPI, **options) -> AdmissionControl:
+    control = AdmissionControl(**options)
+    if os.getenv("ADMISSION_CONTROL", "1").lower() not in ("0", "false", "no"):
+        app.add_middleware(AdmissionMiddleware, control=control)
+    return control
@@ -0,0 +1,325 @@
+"""Opt-in request timing and profiling for FastAPI apps.
+
+`install_metrics(app)` records, per route, the wall time of each request and
+how it splits into request validation, the endpoint itself and response
+serialization. The histograms are served on /metrics in the Prometheus text
+format. A fraction of requests can also have their endpoint profiled and
+dumped to disk.
+
+Call it right after creating the app: the per-phase timing comes from a
+custom route class, which only applies to routes declared afterwards.
+"""
+
+import asyncio
+import contextvars
+import cProfile
+import functools
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # pyinstrument is optional, cProfile is the fallback
+    Profiler = None
+
+# Upper bounds (seconds) of the histogram buckets, the last bucket is +Inf
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class _Shard:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+
+
+class Histogram:
+    """Fixed-bucket histogram whose observe() never takes a lock.
+
+    Every thread (the event loop and each thread pool worker) writes to its
+    own shard; shards are only merged when the histogram is read.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()
+
+    def observe(self, value: float):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard(len(self.buckets) + 1)
+            # Only taken once per thread, when the thread records its first value
+            with self._shards_lock:
+                self._shards.append(shard)
+        shard.counts[bisect_left(self.buckets, value)] += 1
+        shard.sum += value
+
+    # Merged per-bucket counts (not cumulative) and the sum of all values
+    def snapshot(self) -> Tuple[List[int], float]:
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for index, count in enumerate(shard.counts):
+                counts[index] += count
+            total += shard.sum
+        return counts, total
+
+
+class _RequestTimings:
+    __slots__ = ("handler_start", "endpoint_start", "endpoint_end", "handler_end", "profile", "profiler")
+
+    def __init__(self, profile: bool = False):
+        self.handler_start = self.endpoint_start = self.endpoint_end = self.handler_end = None
+        # Whether to profile the endpoint, and the profiler that did once it ran
+        self.profile = profile
+        self.profiler = None
+
+
+_current_timings: contextvars.ContextVar[Optional[_RequestTimings]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that notes when the endpoint starts and ends.
+
+    Everything the route handler does before the endpoint runs is request
+    parsing and validation; everything after it is response validation and
+    serialization. Sampled requests are profiled here too, on the thread the
+    endpoint actually runs on.
+    """
+
+    def get_route_handler(self):
+        call = self.dependant.call
+        # Keep the wrapper sync for sync endpoints so FastAPI still runs them in the thread pool
+        if asyncio.iscoroutinefunction(call):
+
+            @functools.wraps(call)
+            async def timed_call(*args, **kwargs):
+                timings = _current_timings.get()
+                profiler = _start_endpoint_profile(timings, in_thread=False)
+                if timings is not None:
+                    timings.endpoint_start = time.perf_counter()
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    if timings is not None:
+                        timings.endpoint_end = time.perf_counter()
+                    _stop_endpoint_profile(timings, profiler)
+
+        else:
+
+            @functools.wraps(call)
+            def timed_call(*args, **kwargs):
+                timings = _current_timings.get()
+                profiler = _start_endpoint_profile(timings, in_thread=True)
+                if timings is not None:
+                    timings.endpoint_start = time.perf_counter()
+                try:
+                    return call(*args, **kwargs)
+                finally:
+                    if timings is not None:
+                        timings.endpoint_end = time.perf_counter()
+                    _stop_endpoint_profile(timings, profiler)
+
+        self.dependant.call = timed_call
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            timings = _current_timings.get()
+            if timings is not None:
+                timings.handler_start = time.perf_counter()
+            response = await handler(request)
+            if timings is not None:
+                timings.handler_end = time.perf_counter()
+            return response
+
+        return timed_handler
+
+
+# Start profiling the endpoint when its request was sampled. Sync endpoints run in a
+# thread pool worker, and both profilers only follow the thread that started them.
+def _start_endpoint_profile(timings: Optional[_RequestTimings], in_thread: bool):
+    if timings is None or not timings.profile:
+        return None
+    if Profiler is not None:
+        # In async mode pyinstrument leaves out other requests interleaved on the event loop
+        profiler = Profiler(async_mode="disabled" if in_thread else "enabled")
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler
+
+
+def _stop_endpoint_profile(timings: Optional[_RequestTimings], profiler):
+    if profiler is None:
+        return
+    if Profiler is not None:
+        profiler.stop()
+    else:
+        profiler.disable()
+    timings.profiler = profiler
+
+
+class RequestMetrics:
+    """Histograms of request time keyed by (method, route, phase)."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms: Dict[Tuple[str, str, str], Histogram] = {}
+
+    def observe(self, method: str, route: str, phase: str, seconds: float):
+        key = (method, route, phase)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms.setdefault(key, Histogram(self.buckets))
+        histogram.observe(seconds)
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP http_request_duration_seconds Time spent on requests, by route and phase.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route, phase), histogram in sorted(self._histograms.items()):
+            counts, total = histogram.snapshot()
+            labels = f'method="{_escape(method)}",route="{_escape(route)}",phase="{phase}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {total}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RequestProfiler:
+    """Profiles the endpoint of a random sample of requests, one file per profiled request.
+
+    Uses pyinstrument (HTML output) when installed, otherwise cProfile
+    (.prof files for pstats/snakeviz). Only one request is profiled at a time.
+    cProfile on an async endpoint also records whatever else the event loop
+    runs meanwhile; install pyinstrument to profile async endpoints.
+    """
+
+    def __init__(self, directory: str, sample_rate: float):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self._active = False
+        self._counter = itertools.count()
+        os.makedirs(directory, exist_ok=True)
+
+    # Whether to profile the next request; call finish() after a sampled request
+    def sample(self) -> bool:
+        if self._active or random.random() >= self.sample_rate:
+            return False
+        self._active = True
+        return True
+
+    # Write the profile of a sampled request (None when its endpoint never ran)
+    def finish(self, profiler, method: str, route: str):
+        try:
+            if profiler is None:
+                return
+            route_name = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{next(self._counter)}-{method}-{route_name}"
+            if Profiler is not None:
+                with open(os.path.join(self.directory, f"{name}.html"), "w") as file:
+                    file.write(profiler.output_html())
+            else:
+                profiler.dump_stats(os.path.join(self.directory, f"{name}.prof"))
+        finally:
+            self._active = False
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording the wall time and phases of every HTTP request."""
+
+    def __init__(self, app, metrics: RequestMetrics, profiler: Optional[RequestProfiler] = None):
+        self.app = app
+        self.metrics = metrics
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = _RequestTimings(profile=self.profiler is not None and self.profiler.sample())
+        token = _current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            end = time.perf_counter()
+            _current_timings.reset(token)
+            # The router stores the matched route in the scope, its path is the low-cardinality label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            self.metrics.observe(method, route, "total", end - start)
+            if timings.endpoint_start is not None and timings.handler_start is not None:
+                self.metrics.observe(method, route, "validation", timings.endpoint_start - timings.handler_start)
+            if timings.endpoint_end is not None and timings.endpoint_start is not None:
+                self.metrics.observe(method, route, "endpoint", timings.endpoint_end - timings.endpoint_start)
+            if timings.handler_end is not None and timings.endpoint_end is not None:
+                self.metrics.observe(method, route, "serialization", timings.handler_end - timings.endpoint_end)
+            if timings.profile:
+                # Rendering and writing the profile is blocking work, keep it off the event loop
+                await run_in_threadpool(self.profiler.finish, timings.profiler, method, route)
+
+
+def install_metrics(
+    app: FastAPI,
+    path: str = "/metrics",
+    profile_dir: Optional[str] = None,
+    profile_sample_rate: float = 0.0,
+) -> RequestMetrics:
+    metrics = RequestMetrics()
+    app.router.route_class = TimedRoute
+    profiler = None
+    if profile_dir and profile_sample_rate > 0:
+        profiler = RequestProfiler(profile_dir, profile_sample_rate)
+    app.add_middleware(MetricsMiddleware, metrics=metrics, profiler=profiler)
+
+    async def prometheus_metrics():
+        return PlainTextResponse(
+            metrics.render_prometheus(), media_type="text/plain; version=0.0.4"
+        )
+
+    app.add_api_route(path, prometheus_metrics, methods=["GET"], include_in_schema=False)
+    return metrics
+
+
+# Install metrics when ENABLE_METRICS is set; METRICS_PROFILE_DIR and
+# METRICS_PROFILE_RATE (0-1) turn on sampled profiling
+def install_metrics_from_env(app: FastAPI) -> Optional[RequestMetrics]:
+    if os.getenv("ENABLE_METRICS", "").lower() not in ("1", "true", "yes"):
+        return None
+    return install_metrics(
+        app,
+        profile_dir=os.getenv("METRICS_PROFILE_DIR"),
+        profile_sample_rate=float(os.getenv("METRICS_PROFILE_RATE", "0")),
+    )
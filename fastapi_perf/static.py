@@ -0,0 +1,99 @@
+"""Precompressed responses for documents that never change while the app runs.
+
+A `StaticDocument` encodes its content once, when it is created, as plain,
+gzip and (when the `brotli` package is installed) brotli bodies, each with a
+strong ETag. Serving it only picks a variant from Accept-Encoding and checks
+If-None-Match, so nothing is rendered or compressed per request.
+"""
+
+import gzip
+import hashlib
+from typing import Dict, List, Optional, Tuple, Union
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Content codings in the order the server prefers them when the client accepts several equally
+PREFERRED_ENCODINGS = ("br", "gzip", "identity")
+IMPLICIT_IDENTITY_WEIGHT = 0.001
+
+
+class StaticDocument:
+    """A fixed document, stored pre-encoded and served with content negotiation."""
+
+    def __init__(
+        self,
+        content: Union[str, bytes],
+        media_type: str,
+        cache_control: str = "public, max-age=3600",
+    ):
+        body = content.encode() if isinstance(content, str) else content
+        self.media_type = media_type
+        self.cache_control = cache_control
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        # Every variant is a different representation, so each gets its own strong ETag
+        self.variants: Dict[str, Tuple[bytes, str]] = {"identity": (body, f'"{digest}"')}
+        compressed = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed["br"] = brotli.compress(body, quality=11)
+        for encoding, encoded in compressed.items():
+            # Tiny documents can grow when compressed; only keep variants that are smaller
+            if len(encoded) < len(body):
+                self.variants[encoding] = (encoded, f'"{digest}-{encoding}"')
+
+    # Pick the best variant the client accepts
+    def choose_encoding(self, accept_encoding: Optional[str]) -> Optional[str]:
+        weights = parse_accept_encoding(accept_encoding)
+        best, best_weight = None, 0.0
+        for encoding in PREFERRED_ENCODINGS:
+            if encoding not in self.variants:
+                continue
+            # identity is acceptable unless excluded, but loses to any compressed coding the client lists
+            default = IMPLICIT_IDENTITY_WEIGHT if encoding == "identity" else 0.0
+            weight = weights.get(encoding, weights.get("*", default))
+            if weight > best_weight:
+                best, best_weight = encoding, weight
+        return best
+
+    def response(self, request: Request) -> Response:
+        encoding = self.choose_encoding(request.headers.get("accept-encoding"))
+        if encoding is None:
+            return Response(status_code=406, headers={"Vary": "Accept-Encoding"})
+        body, etag = self.variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+
+# Map each coding in an Accept-Encoding header to its q-value
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        coding, *params = [piece.strip() for piece in part.split(";")]
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.lower()] = weight
+    return weights
+
+
+# If-None-Match uses the weak comparison, so a W/ prefix on the client's tag is ignored
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags: List[str] = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
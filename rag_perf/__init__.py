@@ -0,0 +1 @@
+"""Ingestion helpers shared by the Streamlit PDF chat apps."""
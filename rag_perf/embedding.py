@@ -0,0 +1,186 @@
+"""Batched, concurrent embedding with adaptive batch size and retries.
+
+`Chroma.from_documents` passes every chunk to a single `embed_documents`
+call, which `OllamaEmbeddings` sends as one request: the embedding server
+works through it on one slot while its other slots sit idle, and one failed
+request loses the whole document. `EmbeddingExecutor` wraps any LangChain
+`Embeddings` and is one itself:
+
+    embeddings = EmbeddingExecutor(OllamaEmbeddings(model="mxbai-embed-large"), max_in_flight=4)
+    Chroma.from_documents(chunks, embedding=embeddings)
+
+Texts are cut into batches that are sent `max_in_flight` at a time. Each
+request is timed: while requests finish well under `target_latency` the
+batch size grows, when they take longer it shrinks, so requests stay short
+enough to spread over the server's slots and to retry cheaply. A failed
+request is retried with exponential backoff before the call gives up.
+
+`submit(texts)` returns a future instead of blocking, which lets the
+ingestion pipeline keep several batches in flight (see `rag_perf.pipeline`).
+Cancelling that future stops the remaining batches of its texts.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+Vectors = List[List[float]]
+
+
+@dataclass
+class EmbeddingStats:
+    requests: int = 0
+    texts: int = 0
+    retries: int = 0
+    failures: int = 0
+    batch_size: int = 0
+
+
+class _EmbeddingJob:
+    """One `submit` call: its texts are handed out a batch at a time to whichever request slot is free."""
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.vectors: Vectors = [None] * len(texts)
+        self.future: Future = Future()
+        self.next_offset = 0
+        self.remaining = len(texts)
+
+
+class EmbeddingExecutor(Embeddings):
+    """Embeds texts in adaptively sized batches with several requests in flight."""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_in_flight: int = 4,
+        batch_size: int = 32,
+        min_batch_size: int = 1,
+        max_batch_size: int = 512,
+        target_latency: float = 2.0,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+    ):
+        self.embeddings = embeddings
+        self.max_in_flight = max_in_flight
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.stats = EmbeddingStats(batch_size=batch_size)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_in_flight, thread_name_prefix="embedding")
+        # Jobs whose future is not done yet, failed by `shutdown`
+        self._jobs = set()
+
+    @property
+    def batch_size(self) -> int:
+        return self.stats.batch_size
+
+    # Start embedding `texts`; the future resolves to their vectors, in order
+    def submit(self, texts: List[str]) -> Future:
+        job = _EmbeddingJob(list(texts))
+        if not job.texts:
+            job.future.set_result([])
+            return job.future
+        # Each worker takes batches from the job until none are left, so at most max_in_flight requests run
+        with self._lock:
+            self._jobs.add(job)
+        job.future.add_done_callback(lambda _: self._forget(job))
+        workers = min(self.max_in_flight, -(-len(job.texts) // self.batch_size))
+        for _ in range(workers):
+            self._pool.submit(self._drain, job)
+        return job.future
+
+    def embed_documents(self, texts: List[str]) -> Vectors:
+        return self.submit(texts).result()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    # Stop the request threads. Texts submitted but not embedded yet are dropped, their futures cancelled;
+    # `wait=False` returns without waiting for the requests already sent.
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            jobs = list(self._jobs)
+        for job in jobs:
+            job.future.cancel()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _forget(self, job: _EmbeddingJob):
+        with self._lock:
+            self._jobs.discard(job)
+
+    def _drain(self, job: _EmbeddingJob):
+        while True:
+            with self._lock:
+                if job.future.done() or job.next_offset >= len(job.texts):
+                    return
+                start = job.next_offset
+                job.next_offset = min(len(job.texts), start + self.stats.batch_size)
+                stop = job.next_offset
+            try:
+                vectors = self._embed_batch(job.texts[start:stop])
+            except Exception as exc:
+                with self._lock:
+                    self.stats.failures += 1
+                _settle(job.future.set_exception, exc)
+                return
+            job.vectors[start:stop] = vectors
+            with self._lock:
+                job.remaining -= stop - start
+                finished = job.remaining == 0
+            if finished:
+                _settle(job.future.set_result, job.vectors)
+
+    # One request, retried with exponential backoff and jitter
+    def _embed_batch(self, texts: List[str]) -> Vectors:
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+                if len(vectors) != len(texts):
+                    raise ValueError(f"Expected {len(texts)} embeddings, got {len(vectors)}")
+            except Exception:
+                self._adapt(len(texts), None)
+                if attempt >= self.max_retries:
+                    raise
+                with self._lock:
+                    self.stats.retries += 1
+                time.sleep(self.retry_backoff * 2**attempt * random.uniform(0.5, 1.5))
+                attempt += 1
+                continue
+            self._adapt(len(texts), time.perf_counter() - started)
+            return vectors
+
+    # Grow the batch size while requests are quick, shrink it when they are slow or fail
+    def _adapt(self, size: int, latency):
+        with self._lock:
+            stats = self.stats
+            if latency is None:
+                stats.batch_size = max(self.min_batch_size, stats.batch_size // 2)
+                return
+            stats.requests += 1
+            stats.texts += size
+            # Only a full-size request says something about the current batch size
+            if size < stats.batch_size:
+                return
+            if latency > self.target_latency:
+                stats.batch_size = max(self.min_batch_size, stats.batch_size // 2)
+            elif latency < self.target_latency / 2:
+                stats.batch_size = min(self.max_batch_size, stats.batch_size + max(1, stats.batch_size // 2))
+
+
+# Complete a job's future unless it is already done: failed by another batch, or cancelled by the caller
+def _settle(complete, value):
+    try:
+        complete(value)
+    except InvalidStateError:
+        pass
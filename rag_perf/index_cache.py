@@ -0,0 +1,222 @@
+"""Vector indexes of uploaded PDFs, kept on disk and keyed by content.
+
+Each document gets its own Chroma collection in `<root>/<key>/`, where the
+key is a SHA-256 of the PDF bytes plus a namespace naming the embedding
+model and chunking settings. A renamed copy of a PDF therefore reuses its
+index, while a different file with the same name gets its own. Any session
+(and any later run of the app) that uploads a document already indexed
+opens the stored collection without a single embedding call:
+
+    index_cache = IndexCache("pdf_index")
+    key = index_cache.key(pdf_bytes, namespace="mxbai-embed-large/1000/200")
+    vectorstore = index_cache.get_or_build(key, embeddings, build)
+
+A collection only counts as cached once `build` returned and its manifest
+was written, so a crash mid-ingestion is rebuilt on the next upload.
+
+`get_or_start` is the streaming variant: `start(persist_directory)` returns
+the collection together with a job still filling it in the background (see
+`rag_perf.pipeline`). The collection is handed out right away, also to other
+sessions uploading the same PDF meanwhile, and the manifest is written when
+the job succeeds.
+
+Unbounded, every distinct upload would keep its directory forever.
+`max_entries` and `max_age` (seconds) bound the cache: after each build the
+least recently used collections beyond `max_entries`, and those unused for
+longer than `max_age`, are deleted, as are directories of builds that never
+finished. Collections still being built are never evicted.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from langchain_community.vectorstores import Chroma
+
+MANIFEST_NAME = "index.json"
+# Name of the collection in each directory; LangChain's default, so stores opened without one agree
+COLLECTION_NAME = "langchain"
+
+
+class IndexCache:
+    """Content-addressed directory of persisted Chroma collections."""
+
+    def __init__(self, root: str, max_entries: Optional[int] = None, max_age: Optional[float] = None):
+        self.root = root
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # One lock per key, so two sessions uploading the same PDF embed it once
+        self._key_locks: Dict[str, threading.Lock] = {}
+        # Collections opened by this process, shared by every session
+        self._open: Dict[str, Chroma] = {}
+        # Collections still being filled by a background job, with that job
+        self._building: Dict[str, tuple] = {}
+        os.makedirs(root, exist_ok=True)
+        self.evict()
+
+    # Cache key for a PDF's bytes; `namespace` should change whenever the embeddings would
+    @staticmethod
+    def key(data: bytes, namespace: str = "") -> str:
+        digest = hashlib.sha256(data)
+        digest.update(b"\0" + namespace.encode())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self.path(key), MANIFEST_NAME))
+
+    # Manifest written when the collection was built, None when it is not cached
+    def info(self, key: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.path(key), MANIFEST_NAME)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    # The cached collection for `key`, or None when the document was never indexed
+    def get(self, key: str, embeddings) -> Optional[Chroma]:
+        with self._lock:
+            vectorstore = self._open.get(key)
+        if vectorstore is None and key in self:
+            vectorstore = Chroma(
+                collection_name=COLLECTION_NAME, persist_directory=self.path(key), embedding_function=embeddings
+            )
+            with self._lock:
+                vectorstore = self._open.setdefault(key, vectorstore)
+        if vectorstore is not None:
+            self._touch(key)
+        return vectorstore
+
+    # The cached collection for `key`, calling `build(persist_directory)` to create it on a miss.
+    # `info` is saved in the manifest, e.g. the file name and chunk count.
+    def get_or_build(
+        self, key: str, embeddings, build: Callable[[str], Chroma], info: Optional[dict] = None
+    ) -> Chroma:
+        vectorstore = self.get(key, embeddings)
+        if vectorstore is not None:
+            return vectorstore
+        with self._lock:
+            building = self._building.get(key)
+        if building is not None:
+            # Being filled by `get_or_start`, wait for it instead of starting over
+            building[1].wait()
+            return building[0]
+        with self._key_lock(key):
+            # Another session may have finished building it while we waited
+            vectorstore = self.get(key, embeddings)
+            if vectorstore is not None:
+                return vectorstore
+            directory = self.path(key)
+            # A directory without a manifest is a build that never finished
+            shutil.rmtree(directory, ignore_errors=True)
+            vectorstore = build(directory)
+            self._write_manifest(key, {**(info or {}), "key": key, "created_at": time.time()})
+            with self._lock:
+                self._open[key] = vectorstore
+        self.evict()
+        return vectorstore
+
+    # The collection for `key` and, when it is still being filled, the job filling it.
+    # On a miss `start(persist_directory)` must return (collection, job); `job.wait()` raises if it failed.
+    def get_or_start(
+        self, key: str, embeddings, start: Callable[[str], tuple], info: Optional[dict] = None
+    ) -> Tuple[Chroma, Optional[object]]:
+        with self._key_lock(key):
+            vectorstore = self.get(key, embeddings)
+            if vectorstore is not None:
+                return vectorstore, None
+            with self._lock:
+                building = self._building.get(key)
+            if building is not None:
+                return building
+            directory = self.path(key)
+            shutil.rmtree(directory, ignore_errors=True)
+            vectorstore, job = start(directory)
+            with self._lock:
+                self._building[key] = (vectorstore, job)
+        threading.Thread(target=self._finish, args=(key, vectorstore, job, info), daemon=True).start()
+        return vectorstore, job
+
+    # Mark a background build as cached once its job succeeds, or throw it away if it failed
+    def _finish(self, key: str, vectorstore: Chroma, job, info: Optional[dict]):
+        try:
+            job.wait()
+        except Exception:
+            with self._key_lock(key):
+                with self._lock:
+                    self._building.pop(key, None)
+                shutil.rmtree(self.path(key), ignore_errors=True)
+            return
+        with self._key_lock(key):
+            self._write_manifest(key, {**(info or {}), "key": key, "created_at": time.time()})
+            with self._lock:
+                self._open[key] = vectorstore
+                self._building.pop(key, None)
+        self.evict()
+
+    def remove(self, key: str):
+        with self._key_lock(key):
+            with self._lock:
+                self._open.pop(key, None)
+            shutil.rmtree(self.path(key), ignore_errors=True)
+
+    # Delete the collections beyond `max_entries` or older than `max_age`, least recently used first,
+    # and unfinished builds. Keys being built, or locked by a build in progress, are skipped.
+    def evict(self):
+        entries = []
+        for key in os.listdir(self.root):
+            if not os.path.isdir(self.path(key)):
+                continue
+            try:
+                last_used = os.path.getmtime(os.path.join(self.path(key), MANIFEST_NAME))
+            except FileNotFoundError:
+                last_used = None
+            entries.append((last_used, key))
+        now = time.time()
+        finished = sorted((entry for entry in entries if entry[0] is not None), reverse=True)
+        for index, (last_used, key) in enumerate(finished):
+            too_many = self.max_entries is not None and index >= self.max_entries
+            too_old = self.max_age is not None and now - last_used > self.max_age
+            if too_many or too_old:
+                self._evict_key(key)
+        for last_used, key in entries:
+            if last_used is None:
+                self._evict_key(key)
+
+    def _evict_key(self, key: str):
+        lock = self._key_lock(key)
+        if not lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                if key in self._building:
+                    return
+                self._open.pop(key, None)
+            shutil.rmtree(self.path(key), ignore_errors=True)
+        finally:
+            lock.release()
+
+    # Record that a collection was used, its manifest's mtime orders eviction
+    def _touch(self, key: str):
+        try:
+            os.utime(os.path.join(self.path(key), MANIFEST_NAME))
+        except FileNotFoundError:
+            pass
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _write_manifest(self, key: str, info: dict):
+        path = os.path.join(self.path(key), MANIFEST_NAME)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(info, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,148 @@
+"""Load PDF pages straight from memory.
+
+`PyPDFLoader` only takes a file path, so an uploaded PDF used to be written
+to a temporary file just to be read back. `InMemoryPDFLoader` hands the
+upload's buffer to pypdf directly and yields one `Document` per page as it
+is extracted, with the same `source`/`page` metadata as `PyPDFLoader`:
+
+    documents = InMemoryPDFLoader(uploaded_file, source=uploaded_file.name).lazy_load()
+    chunks = text_splitter.split_documents(documents)
+
+Text extraction is CPU-bound pure Python, so one process reads one page at a
+time however many cores there are. `ParallelPDFLoader` is a drop-in
+replacement that splits the pages into ranges extracted by a process pool
+and still yields the documents in page order.
+"""
+
+import io
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, List, Optional, Union
+
+import pypdf
+from langchain_core.document_loaders import BaseLoader
+from langchain_core.documents import Document
+
+PDFData = Union[bytes, bytearray, memoryview, BinaryIO]
+
+
+# A seekable stream over `data`; streams (such as Streamlit's UploadedFile) and bytes are used without a copy
+def as_stream(data: PDFData) -> BinaryIO:
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return io.BytesIO(data)
+    data.seek(0)
+    return data
+
+
+# Copy of the PDF's bytes, for handing to worker processes
+def as_bytes(data: PDFData) -> bytes:
+    if isinstance(data, bytes):
+        return data
+    if isinstance(data, (bytearray, memoryview)):
+        return bytes(data)
+    if isinstance(data, io.BytesIO):
+        return data.getvalue()
+    data.seek(0)
+    return data.read()
+
+
+class InMemoryPDFLoader(BaseLoader):
+    """Loads a PDF held in memory, one document per page."""
+
+    def __init__(self, data: PDFData, source: str = "uploaded.pdf", password: str = None):
+        self.data = data
+        self.source = source
+        self.password = password
+
+    def lazy_load(self) -> Iterator[Document]:
+        reader = pypdf.PdfReader(as_stream(self.data), password=self.password)
+        total_pages = len(reader.pages)
+        for page_number, page in enumerate(reader.pages):
+            yield Document(
+                page_content=page.extract_text().strip(),
+                metadata={"source": self.source, "page": page_number, "total_pages": total_pages},
+            )
+
+
+# Pages per task sent to a worker: enough to amortise the round trip, small enough to balance the load
+PAGES_PER_SHARD = 16
+
+# PDF reader of each worker process, opened once by the pool initializer
+_worker_reader: Optional[pypdf.PdfReader] = None
+
+
+def _open_worker_reader(data: bytes, password: Optional[str]):
+    global _worker_reader
+    _worker_reader = pypdf.PdfReader(io.BytesIO(data), password=password)
+
+
+def _extract_pages(start: int, stop: int) -> List[str]:
+    return [_worker_reader.pages[number].extract_text().strip() for number in range(start, stop)]
+
+
+class ParallelPDFLoader(InMemoryPDFLoader):
+    """Loads a PDF held in memory with page ranges extracted in parallel processes.
+
+    Each worker receives the PDF once and then extracts `pages_per_shard`
+    pages per task. At most two tasks per worker are queued ahead of the
+    page being yielded, so a slow consumer does not pile up extracted text.
+    PDFs shorter than `min_parallel_pages` are read in this process, where
+    starting a pool would cost more than it saves.
+
+    Workers are spawned rather than forked: the loader is called from
+    threaded hosts such as Streamlit's script runner, and forking a process
+    while another thread holds a lock can deadlock the child.
+    """
+
+    def __init__(
+        self,
+        data: PDFData,
+        source: str = "uploaded.pdf",
+        password: str = None,
+        max_workers: Optional[int] = None,
+        pages_per_shard: int = PAGES_PER_SHARD,
+        min_parallel_pages: int = 4 * PAGES_PER_SHARD,
+    ):
+        super().__init__(data, source, password)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.pages_per_shard = pages_per_shard
+        self.min_parallel_pages = min_parallel_pages
+
+    def lazy_load(self) -> Iterator[Document]:
+        total_pages = len(pypdf.PdfReader(as_stream(self.data), password=self.password).pages)
+        shards = [
+            (start, min(start + self.pages_per_shard, total_pages))
+            for start in range(0, total_pages, self.pages_per_shard)
+        ]
+        workers = min(self.max_workers, len(shards))
+        if workers <= 1 or total_pages < self.min_parallel_pages:
+            yield from super().lazy_load()
+            return
+
+        pool = ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_open_worker_reader,
+            initargs=(as_bytes(self.data), self.password),
+        )
+        pending = deque()
+        try:
+            for start, stop in shards:
+                pending.append((start, pool.submit(_extract_pages, start, stop)))
+                if len(pending) < 2 * workers:
+                    continue
+                yield from self._documents(*pending.popleft(), total_pages)
+            while pending:
+                yield from self._documents(*pending.popleft(), total_pages)
+        finally:
+            # Also reached when the consumer stops early: drop the shards nobody will read
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _documents(self, start: int, future, total_pages: int) -> Iterator[Document]:
+        for page_number, text in enumerate(future.result(), start):
+            yield Document(
+                page_content=text,
+                metadata={"source": self.source, "page": page_number, "total_pages": total_pages},
+            )
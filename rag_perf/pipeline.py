@@ -0,0 +1,287 @@
+"""Streaming ingestion: extract -> split -> embed -> upsert, all at once.
+
+Loading a whole PDF, then splitting all of it, then embedding every chunk
+keeps the whole document in memory several times over, and nothing can be
+queried until the last stage ends. `IngestPipeline` runs the stages in
+their own threads, joined by small bounded queues:
+
+    pages -> [read page] -> [split into chunks, batch] -> [embed batch] -> [upsert batch]
+
+Each stage works on the next batch while the following stage handles the
+previous one, a full queue makes the stages before it wait, so memory holds
+a few batches rather than the whole document, and the first pages are
+searchable as soon as their batch is upserted. A batch is sent on before it
+is full once the first page is split or when it has waited `flush_interval`
+seconds, so embedding starts right away even on slowly extracted PDFs.
+`embed` may also return a future (e.g. `EmbeddingExecutor.submit`), so that
+several batches are being embedded while earlier ones are stored:
+
+    job = IngestPipeline(splitter, embeddings.embed_documents, chroma_upsert(collection)).start(pages)
+    job.wait_first_batch()  # the vector store now answers queries about the first pages
+    job.wait()              # everything is stored
+
+When a stage fails, the job stops: the other stages leave their queues,
+batches still queued are dropped (pending embeddings cancelled) and the page
+iterator is closed, which also shuts down a `ParallelPDFLoader`'s workers.
+"""
+
+import hashlib
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Union
+
+from langchain_core.documents import Document
+
+Vectors = List[List[float]]
+EmbedFunction = Callable[[List[str]], Union[Vectors, Future]]
+UpsertFunction = Callable[[List[Document], Vectors], None]
+
+# Marks the end of the stream on a queue
+_END = object()
+# Returned by _get when no item arrived before its timeout
+_TIMEOUT = object()
+
+
+@dataclass
+class IngestProgress:
+    pages: int = 0
+    chunks: int = 0
+    embedded: int = 0
+    stored: int = 0
+
+
+class IngestJob:
+    """A running ingestion: progress counters and events to wait on."""
+
+    def __init__(self):
+        self.progress = IngestProgress()
+        self.error: Optional[BaseException] = None
+        self.first_batch = threading.Event()
+        self.finished = threading.Event()
+        # Set when a stage failed, telling the others to stop
+        self.stopped = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.finished.is_set()
+
+    # Wait until the first batch is stored (or the whole job ended), raising the job's error if it failed
+    def wait_first_batch(self, timeout: Optional[float] = None) -> bool:
+        ready = self.first_batch.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return ready
+
+    # Wait for every chunk to be stored, raising the job's error if it failed
+    def wait(self, timeout: Optional[float] = None) -> IngestProgress:
+        if not self.finished.wait(timeout):
+            raise TimeoutError("Ingestion is still running")
+        if self.error is not None:
+            raise self.error
+        return self.progress
+
+    def _fail(self, error: BaseException):
+        if self.error is None:
+            self.error = error
+        self.stopped.set()
+        self.first_batch.set()
+        self.finished.set()
+
+
+# Stable id of a chunk, so ingesting the same document again overwrites instead of duplicating
+def chunk_id(chunk: Document, index: int) -> str:
+    source = f"{chunk.metadata.get('source')}:{chunk.metadata.get('page')}:{index}"
+    return hashlib.sha1(source.encode() + b"\0" + chunk.page_content.encode()).hexdigest()
+
+
+# Upsert function storing chunks with precomputed vectors in a Chroma collection, such as
+# `client.get_or_create_collection(COLLECTION_NAME)` of the client a LangChain `Chroma` was opened with.
+# (`Chroma.add_texts` would embed every batch again with the store's own embedding function.)
+def chroma_upsert(collection) -> UpsertFunction:
+    def upsert(chunks: List[Document], vectors: Vectors):
+        collection.upsert(
+            ids=[chunk.metadata["chunk_id"] for chunk in chunks],
+            embeddings=vectors,
+            documents=[chunk.page_content for chunk in chunks],
+            metadatas=[chunk.metadata for chunk in chunks],
+        )
+
+    return upsert
+
+
+class IngestPipeline:
+    """Splits, embeds and stores a stream of pages in overlapping stages.
+
+    `embed` turns a list of texts into vectors (e.g. `embeddings.embed_documents`)
+    or into a future of them, `upsert` stores a batch of chunks with their
+    vectors. Chunks are grouped into batches of at most `batch_size`; each
+    queue between stages holds at most `queue_size` pages or batches.
+    """
+
+    def __init__(
+        self,
+        splitter,
+        embed: EmbedFunction,
+        upsert: UpsertFunction,
+        batch_size: int = 64,
+        queue_size: int = 4,
+        flush_interval: float = 0.5,
+    ):
+        self.splitter = splitter
+        self.embed = embed
+        self.upsert = upsert
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+
+    # Start ingesting `pages` in background threads
+    def start(self, pages: Iterable[Document]) -> IngestJob:
+        job = IngestJob()
+        to_split: queue.Queue = queue.Queue(self.queue_size)
+        to_embed: queue.Queue = queue.Queue(self.queue_size)
+        to_store: queue.Queue = queue.Queue(self.queue_size)
+        # Each stage with the queue it reads from, emptied if the job stops
+        stages = [
+            (self._read, (job, pages, to_split), None),
+            (self._split, (job, to_split, to_embed), to_split),
+            (self._embed, (job, to_embed, to_store), to_embed),
+            (self._store, (job, to_store), to_store),
+        ]
+        for target, args, source in stages:
+            threading.Thread(target=self._run_stage, args=(job, target, args, source), daemon=True).start()
+        return job
+
+    # Ingest `pages` and return once everything is stored
+    def run(self, pages: Iterable[Document]) -> IngestProgress:
+        return self.start(pages).wait()
+
+    @staticmethod
+    def _run_stage(job: IngestJob, target, args, source: Optional[queue.Queue]):
+        try:
+            target(*args)
+        except _Stopped:
+            pass
+        except BaseException as exc:
+            job._fail(exc)
+        finally:
+            if source is not None and job.stopped.is_set():
+                # Nothing will read this queue any more: free its batches and a stage blocked putting into it
+                _discard(source)
+
+    def _read(self, job: IngestJob, pages: Iterable[Document], out: queue.Queue):
+        pages = iter(pages)
+        try:
+            for page in pages:
+                _put(job, out, page)
+            _put(job, out, _END)
+        finally:
+            # Stops a generator (and the extraction behind it) that is abandoned half way
+            close = getattr(pages, "close", None)
+            if close is not None:
+                close()
+
+    def _split(self, job: IngestJob, source: queue.Queue, out: queue.Queue):
+        batch: List[Document] = []
+        batch_started = 0.0
+        index = 0
+        while True:
+            timeout = batch_started + self.flush_interval - time.monotonic() if batch else None
+            page = _get(job, source, timeout)
+            if page is _END:
+                break
+            if page is _TIMEOUT:
+                # The batch waited long enough for more chunks, send what there is
+                self._send(job, out, batch)
+                batch = []
+                continue
+            job.progress.pages += 1
+            for chunk in self.splitter.split_documents([page]):
+                chunk.metadata["chunk_id"] = chunk_id(chunk, index)
+                index += 1
+                if not batch:
+                    batch_started = time.monotonic()
+                batch.append(chunk)
+                if len(batch) == self.batch_size:
+                    self._send(job, out, batch)
+                    batch = []
+            # The first page goes out on its own, so embedding starts without waiting for a full batch
+            if job.progress.pages == 1 and batch:
+                self._send(job, out, batch)
+                batch = []
+        if batch:
+            self._send(job, out, batch)
+        _put(job, out, _END)
+
+    @staticmethod
+    def _send(job: IngestJob, out: queue.Queue, batch: List[Document]):
+        job.progress.chunks += len(batch)
+        _put(job, out, batch)
+
+    def _embed(self, job: IngestJob, source: queue.Queue, out: queue.Queue):
+        while (batch := _get(job, source)) is not _END:
+            vectors = self.embed([chunk.page_content for chunk in batch])
+            if not isinstance(vectors, Future):
+                job.progress.embedded += len(batch)
+            try:
+                _put(job, out, (batch, vectors))
+            except _Stopped:
+                if isinstance(vectors, Future):
+                    vectors.cancel()
+                raise
+        _put(job, out, _END)
+
+    def _store(self, job: IngestJob, source: queue.Queue):
+        while (item := _get(job, source)) is not _END:
+            batch, vectors = item
+            if isinstance(vectors, Future):
+                vectors = vectors.result()
+                job.progress.embedded += len(batch)
+            self.upsert(batch, vectors)
+            job.progress.stored += len(batch)
+            job.first_batch.set()
+        job.first_batch.set()
+        job.finished.set()
+
+
+# Queue operations that give up once another stage failed, instead of blocking forever
+def _put(job: IngestJob, q: queue.Queue, item):
+    while not job.stopped.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+    raise _Stopped
+
+
+# Next item of `q`, or _TIMEOUT when none arrived within `timeout` seconds
+def _get(job: IngestJob, q: queue.Queue, timeout: Optional[float] = None):
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not job.stopped.is_set():
+        wait = 0.1 if deadline is None else min(0.1, deadline - time.monotonic())
+        try:
+            if wait <= 0:
+                return q.get_nowait()
+            return q.get(timeout=wait)
+        except queue.Empty:
+            if wait <= 0:
+                return _TIMEOUT
+    raise _Stopped
+
+
+# Empty a queue of a stopped job, cancelling embeddings still pending for its batches
+def _discard(q: queue.Queue):
+    while True:
+        try:
+            item = q.get_nowait()
+        except queue.Empty:
+            return
+        if isinstance(item, tuple) and isinstance(item[1], Future):
+            item[1].cancel()
+
+
+class _Stopped(Exception):
+    """Raised in a stage when the job already ended because another stage failed."""